@@ -1,23 +1,36 @@
 import io
 import os
-import random as py_random
-from flask import Flask, render_template, request, flash, redirect, url_for, session, jsonify
+import re
+import hashlib
+from flask import Flask, render_template, request, flash, redirect, url_for, session, jsonify, Response, stream_with_context, abort, send_from_directory
 from dotenv import load_dotenv
-from flask_mysqldb import MySQL
+from db import PooledMySQL
 from datetime import datetime, timedelta
 import markdown
 from google import genai
-import base64
 from google.genai import types
 from PIL import Image, ImageDraw
-import base64
 import requests
+from urllib3.exceptions import NewConnectionError
 from apscheduler.schedulers.background import BackgroundScheduler
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 import traceback
 import urllib.parse
 import secrets
+import time
+import threading
+import json
+import queue
+import signal
+import click
+from concurrent.futures import ThreadPoolExecutor
+from dispatcher import DispatchEngine, DueHeap
+from linkedin_client import LinkedInClient, LinkedInAPIError, LinkedInRateLimited
+import migrations
+import outbox
+from cache import GenerationCache, LRUCache
+from images import optimize_image, mime_type_for, make_thumbnail, read_and_hash, THUMBNAIL_SIZES
 
 load_dotenv()
 
@@ -38,8 +51,77 @@ app.config['MYSQL_PASSWORD'] = '(hmS-lZQYdsS.)MU'
 app.config['MYSQL_DB'] = 'learntrail_content'
 app.config['MYSQL_CURSORCLASS'] = 'DictCursor'
 
-mysql = MySQL(app)
+# Connection pool: connections are borrowed per app context and reused
+app.config['MYSQL_POOL_SIZE'] = int(os.getenv('MYSQL_POOL_SIZE', 10))
+app.config['MYSQL_POOL_TIMEOUT'] = float(os.getenv('MYSQL_POOL_TIMEOUT', 5))
+app.config['MYSQL_POOL_RECYCLE'] = int(os.getenv('MYSQL_POOL_RECYCLE', 3600))
+app.config['MYSQL_POOL_PRE_PING_AFTER'] = int(os.getenv('MYSQL_POOL_PRE_PING_AFTER', 30))
+
+# Scheduled post dispatch
+app.config['DISPATCH_MAX_WORKERS'] = int(os.getenv('DISPATCH_MAX_WORKERS', 8))
+app.config['DISPATCH_PER_TOKEN_LIMIT'] = int(os.getenv('DISPATCH_PER_TOKEN_LIMIT', 2))
+app.config['IMAGE_UPLOAD_WORKERS'] = int(os.getenv('IMAGE_UPLOAD_WORKERS', 10))
+app.config['IMAGE_MAX_DIMENSION'] = int(os.getenv('IMAGE_MAX_DIMENSION', 1920))
+# Thumbnails and generated images are content-named, so they can be cached for a year
+app.config['IMAGE_CACHE_MAX_AGE'] = int(os.getenv('IMAGE_CACHE_MAX_AGE', 365 * 24 * 3600))
+app.config['VIEW_POSTS_PAGE_SIZE'] = int(os.getenv('VIEW_POSTS_PAGE_SIZE', 25))
+
+# Pre-upload images to LinkedIn ahead of post_date; re-stage when older than the TTL
+app.config['ASSET_STAGE_AHEAD_HOURS'] = int(os.getenv('ASSET_STAGE_AHEAD_HOURS', 6))
+app.config['ASSET_STAGE_TTL_HOURS'] = int(os.getenv('ASSET_STAGE_TTL_HOURS', 24))
+app.config['ASSET_STAGE_INTERVAL_MINUTES'] = int(os.getenv('ASSET_STAGE_INTERVAL_MINUTES', 15))
+app.config['ASSET_STAGE_BATCH_SIZE'] = int(os.getenv('ASSET_STAGE_BATCH_SIZE', 100))
+# Uploaded LinkedIn assets are reused per (owner, image hash) for this long at publish
+# time. Staging always uploads fresh assets, so a staged post's URNs are never older
+# than ASSET_STAGE_TTL_HOURS; keep this at or below that so reused ones aren't either.
+app.config['ASSET_URN_TTL_HOURS'] = int(os.getenv('ASSET_URN_TTL_HOURS', app.config['ASSET_STAGE_TTL_HOURS']))
+app.config['ASSET_URN_CACHE_SIZE'] = int(os.getenv('ASSET_URN_CACHE_SIZE', 2048))
+app.config['DISPATCH_MAX_LATENESS_HOURS'] = int(os.getenv('DISPATCH_MAX_LATENESS_HOURS', 24))
+
+# Publish outbox: claimed jobs are leased, failed ones retried with backoff
+app.config['PUBLISH_CLAIM_BATCH'] = int(os.getenv('PUBLISH_CLAIM_BATCH', 50))
+app.config['PUBLISH_LEASE_SECONDS'] = int(os.getenv('PUBLISH_LEASE_SECONDS', 600))
+app.config['PUBLISH_MAX_ATTEMPTS'] = int(os.getenv('PUBLISH_MAX_ATTEMPTS', 5))
+app.config['PUBLISH_RETRY_BASE_SECONDS'] = int(os.getenv('PUBLISH_RETRY_BASE_SECONDS', 60))
+# Posts that may already be live (lease lost, 5xx, timeout) are not re-sent unless enabled
+app.config['PUBLISH_RETRY_IN_DOUBT'] = os.getenv('PUBLISH_RETRY_IN_DOUBT', '0') == '1'
+# `flask dispatch-worker` polling interval
+app.config['DISPATCH_WORKER_POLL_SECONDS'] = float(os.getenv('DISPATCH_WORKER_POLL_SECONDS', 30))
+app.config['DEFAULT_PUBLISH_TIME'] = os.getenv('DEFAULT_PUBLISH_TIME', '09:00')
+
+# In-process scheduler: set SCHEDULER_ENABLED=0 when an external trigger is used
+app.config['SCHEDULER_ENABLED'] = os.getenv('SCHEDULER_ENABLED', '1') == '1'
+app.config['SCHEDULER_MAX_SLEEP_SECONDS'] = int(os.getenv('SCHEDULER_MAX_SLEEP_SECONDS', 300))
+app.config['SCHEDULER_HEAP_SIZE'] = int(os.getenv('SCHEDULER_HEAP_SIZE', 500))
+
+# LinkedIn request pacing (requests/second) and retry policy
+app.config['LINKEDIN_APP_RATE'] = float(os.getenv('LINKEDIN_APP_RATE', 20))
+app.config['LINKEDIN_TOKEN_RATE'] = float(os.getenv('LINKEDIN_TOKEN_RATE', 5))
+app.config['LINKEDIN_MAX_RETRIES'] = int(os.getenv('LINKEDIN_MAX_RETRIES', 4))
+app.config['LINKEDIN_MAX_RETRY_WAIT'] = float(os.getenv('LINKEDIN_MAX_RETRY_WAIT', 60))
+
+mysql = PooledMySQL(app)
+# Shared by every post being dispatched; kept apart from the dispatch pool so a
+# post worker waiting on its images can never starve them of threads.
+image_upload_pool = ThreadPoolExecutor(
+    max_workers=app.config['IMAGE_UPLOAD_WORKERS'], thread_name_prefix="image-upload"
+)
+# One pooled keep-alive client shared by every LinkedIn call site and worker thread
+linkedin = LinkedInClient(
+    pool_maxsize=app.config['DISPATCH_MAX_WORKERS'] + app.config['IMAGE_UPLOAD_WORKERS'],
+    app_rate=app.config['LINKEDIN_APP_RATE'],
+    token_rate=app.config['LINKEDIN_TOKEN_RATE'],
+    max_retries=app.config['LINKEDIN_MAX_RETRIES'],
+    max_retry_wait=app.config['LINKEDIN_MAX_RETRY_WAIT']
+)
+# (owner_urn, content_hash) -> asset URN; workers record new uploads in
+# new_asset_urns and the dispatching thread persists them to linkedin_assets.
+asset_urn_cache = LRUCache(
+    maxsize=app.config['ASSET_URN_CACHE_SIZE'], ttl=app.config['ASSET_URN_TTL_HOURS'] * 3600
+)
+new_asset_urns = queue.Queue()
 scheduler = BackgroundScheduler()
+dispatch_lock = threading.Lock()
 app.secret_key = "dileep"
 
 # LinkedIn OAuth Configuration
@@ -49,11 +131,35 @@ LINKEDIN_REDIRECT_URI = 'https://connect.learntrail.co.in/linkedin/callback'
 
 print(f"LinkedIn Config: {LINKEDIN_CLIENT_ID}, {LINKEDIN_CLIENT_SECRET}, {LINKEDIN_REDIRECT_URI}")
 
-# Folder to save generated images
-IMAGE_FOLDER = os.path.join('static', 'generated_image')
+# Folder to save generated images (named by content hash)
+IMAGE_FOLDER = os.path.join(app.root_path, 'static', 'generated_image')
+GENERATED_IMAGE_TYPES = {"image/png": ".png", "image/jpeg": ".jpg"}
 os.makedirs(IMAGE_FOLDER, exist_ok=True)
 
 # Initialize Gemini client
+GEMINI_TEXT_MODEL = 'gemini-2.0-flash-exp'
+GENERATION_TEMPERATURE = 0.7
+app.config['GEMINI_MAX_WORKERS'] = int(os.getenv('GEMINI_MAX_WORKERS', 7))
+
+# Generated content waits in generation_drafts (not the session cookie) this long
+app.config['DRAFT_TTL_HOURS'] = int(os.getenv('DRAFT_TTL_HOURS', 72))
+
+# Multi-day schedules: ask for several days per structured call
+app.config['GEMINI_BATCH_GENERATION'] = os.getenv('GEMINI_BATCH_GENERATION', '1') == '1'
+# Output budget of one batch call; each day in it gets the full per-post budget
+app.config['GEMINI_BATCH_MAX_OUTPUT_TOKENS'] = int(os.getenv('GEMINI_BATCH_MAX_OUTPUT_TOKENS', 8192))
+
+# Cache of text generations keyed on model + full prompt + config
+app.config['GEMINI_CACHE_ENABLED'] = os.getenv('GEMINI_CACHE_ENABLED', '1') == '1'
+app.config['GEMINI_CACHE_SIZE'] = int(os.getenv('GEMINI_CACHE_SIZE', 512))
+app.config['GEMINI_CACHE_TTL_SECONDS'] = int(os.getenv('GEMINI_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+app.config['GEMINI_CACHE_DIR'] = os.getenv('GEMINI_CACHE_DIR', '')  # empty keeps it in memory only
+generation_cache = GenerationCache(
+    maxsize=app.config['GEMINI_CACHE_SIZE'],
+    ttl=app.config['GEMINI_CACHE_TTL_SECONDS'],
+    directory=app.config['GEMINI_CACHE_DIR'] or None,
+    enabled=app.config['GEMINI_CACHE_ENABLED']
+)
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
     client = None
@@ -67,6 +173,32 @@ else:
 # ================================
 # LOGIN REQUIRED DECORATOR
 # ================================
+# user_id -> LinkedIn user_urn for verified users only, so protected pages skip the
+# linkedin_tokens lookup; unverified users are always re-read, and entries are
+# dropped whenever that row changes.
+app.config['LOGIN_CHECK_TTL_SECONDS'] = int(os.getenv('LOGIN_CHECK_TTL_SECONDS', 300))
+verified_users = LRUCache(maxsize=4096, ttl=app.config['LOGIN_CHECK_TTL_SECONDS'])
+
+
+def linkedin_user_urn(user_id):
+    """The user's verified LinkedIn URN ('' if not linked), cached per user_id.
+
+    Only verified users are cached: a user who links LinkedIn through another
+    worker process must not keep being sent to /verify_social from this one.
+    """
+    user_urn = verified_users.get(user_id)
+    if user_urn is None:
+        cur = mysql.connection.cursor()
+        cur.execute("SELECT user_urn FROM linkedin_tokens WHERE id=%s", (user_id,))
+        user = cur.fetchone()
+        cur.close()
+
+        user_urn = (user or {}).get('user_urn') or ''
+        if user_urn:
+            verified_users.set(user_id, user_urn)
+    return user_urn
+
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -74,12 +206,7 @@ def login_required(f):
             flash("Please sign in to access this page.", "warning")
             return redirect(url_for('signin'))
 
-        cur = mysql.connection.cursor()
-        cur.execute("SELECT user_urn FROM linkedin_tokens WHERE id=%s", (session['user_id'],))
-        user = cur.fetchone()
-        cur.close()
-
-        if not user or not user['user_urn']:
+        if not linkedin_user_urn(session['user_id']):
             flash("⚠️ Please verify your LinkedIn account to continue.", "warning")
             return redirect(url_for('verify_social'))
 
@@ -179,12 +306,7 @@ def verify_social():
         flash("Please sign in first.", "warning")
         return redirect(url_for('signin'))
 
-    cur = mysql.connection.cursor()
-    cur.execute("SELECT user_urn FROM linkedin_tokens WHERE id=%s", (session['user_id'],))
-    user = cur.fetchone()
-    cur.close()
-
-    if user and user['user_urn']:
+    if linkedin_user_urn(session['user_id']):
         return redirect(url_for('generate_text'))
 
     return render_template('verify_social.html')
@@ -252,22 +374,12 @@ def linkedin_callback():
 
     print(f"[DEBUG] Received authorization code: {code}")
 
-    token_url = "https://www.linkedin.com/oauth/v2/accessToken"
-    data = {
-        "grant_type": "authorization_code",
-        "code": code,
-        "redirect_uri": LINKEDIN_REDIRECT_URI,
-        "client_id": LINKEDIN_CLIENT_ID,
-        "client_secret": LINKEDIN_CLIENT_SECRET
-    }
-
     try:
         print("[DEBUG] Sending POST request to LinkedIn token endpoint...")
-        r = requests.post(token_url, data=data, timeout=10)
-        print(f"[DEBUG] LinkedIn token response status: {r.status_code}")
-        print(f"[DEBUG] LinkedIn token response body: {r.text}")
-        r.raise_for_status()
-        token_data = r.json()
+        token_data = linkedin.exchange_code(
+            code, LINKEDIN_REDIRECT_URI, LINKEDIN_CLIENT_ID, LINKEDIN_CLIENT_SECRET
+        )
+        print(f"[DEBUG] LinkedIn token response body: {token_data}")
     except Exception as e:
         print(f"[ERROR] LinkedIn token request failed: {e}")
         flash(f"❌ Error getting LinkedIn access token: {str(e)}", "danger")
@@ -282,17 +394,14 @@ def linkedin_callback():
     print(f"[DEBUG] Extracted access_token: {access_token}")
 
     try:
-        profile_url = "https://api.linkedin.com/v2/userinfo"
-        headers = {"Authorization": f"Bearer {access_token}"}
-        print(f"[DEBUG] Fetching profile info from {profile_url}")
-        profile_response = requests.get(profile_url, headers=headers, timeout=10)
-
-        if profile_response.status_code != 200:
-            print(f"[ERROR] Failed to fetch LinkedIn profile: {profile_response.status_code}")
+        print("[DEBUG] Fetching LinkedIn userinfo")
+        try:
+            profile_data = linkedin.userinfo(access_token)
+        except LinkedInAPIError as e:
+            print(f"[ERROR] Failed to fetch LinkedIn profile: {e.status_code}")
             flash("❌ Failed to fetch LinkedIn profile.", "danger")
             return redirect(url_for('signin'))
 
-        profile_data = profile_response.json()
         print(f"[DEBUG] LinkedIn profile data: {profile_data}")
 
         user_sub = profile_data.get("sub")
@@ -325,6 +434,7 @@ def linkedin_callback():
             """, (user_sub, access_token, user_name, user_email, session['user_id']))
             mysql.connection.commit()
             cur.close()
+            verified_users.pop(session['user_id'])
 
             # Update session
             session['linkedin_token'] = access_token
@@ -353,6 +463,7 @@ def linkedin_callback():
             """, (access_token, user_name, user_email, user_sub))
             mysql.connection.commit()
             user_id = existing_user['id']
+            verified_users.pop(user_id)
             flash(f"✅ Welcome back, {user_name}!", "success")
 
         else:
@@ -389,190 +500,616 @@ def linkedin_callback():
 # ================================
 # SCHEDULED POSTS BACKGROUND JOB
 # ================================
-@app.route('/run_scheduled_posts')
-def run_scheduled_posts():
-    """Background job to post scheduled content (text + up to 5 images) to LinkedIn"""
-    print(f"[{datetime.now()}] Checking for posts to publish...")
+CONTENT_HASH_RE = re.compile(r"[0-9a-f]{64}")
+
+
+def image_content_hash(img_name):
+    """The content hash of a stored image, or None for legacy non-hashed names."""
+    stem = os.path.splitext(img_name)[0]
+    return stem if CONTENT_HASH_RE.fullmatch(stem) else None
+
+
+def warm_asset_urn_cache(cursor, posts):
+    """Loads still-valid asset URNs for the posts' (author, image) pairs into memory."""
+    pairs = {
+        (post["author_urn"], content_hash)
+        for post in posts
+        for content_hash in map(image_content_hash, post_image_list(post))
+        if content_hash
+    }
+    if not pairs:
+        return
+
+    owners = sorted({owner for owner, _ in pairs})
+    hashes = sorted({content_hash for _, content_hash in pairs})
+    cursor.execute(f"""
+        SELECT owner_urn, content_hash, asset_urn, created_at FROM linkedin_assets
+        WHERE owner_urn IN ({", ".join(["%s"] * len(owners))})
+          AND content_hash IN ({", ".join(["%s"] * len(hashes))})
+          AND created_at > NOW() - INTERVAL %s HOUR
+    """, (*owners, *hashes, app.config['ASSET_URN_TTL_HOURS']))
+
+    ttl = app.config['ASSET_URN_TTL_HOURS'] * 3600
+    for row in cursor.fetchall():
+        key = (row["owner_urn"], row["content_hash"])
+        if key in pairs:
+            asset_urn_cache.set(key, row["asset_urn"], expires_at=row["created_at"].timestamp() + ttl)
+
+
+def save_new_asset_urns(cursor):
+    """Persists asset URNs uploaded by worker threads since the last call; caller commits."""
+    rows = []
+    while True:
+        try:
+            rows.append(new_asset_urns.get_nowait())
+        except queue.Empty:
+            break
+
+    if rows:
+        cursor.executemany("""
+            INSERT INTO linkedin_assets (owner_urn, content_hash, asset_urn, created_at)
+            VALUES (%s, %s, %s, NOW())
+            ON DUPLICATE KEY UPDATE asset_urn = VALUES(asset_urn), created_at = VALUES(created_at)
+        """, rows)
+    return len(rows)
+
+
+def upload_post_image(img_name, author_urn, access_token, use_cache=True):
+    """Registers one image with LinkedIn, uploads its bytes and returns ``(asset_urn, reused)``.
+
+    An asset this author already uploaded for the same image content is reused
+    without any LinkedIn call. Raises on any failure so the caller can report
+    it against this image.
+    """
+    content_hash = image_content_hash(img_name)
+    if use_cache and content_hash:
+        asset_urn = asset_urn_cache.get((author_urn, content_hash))
+        if asset_urn:
+            print(f"[UPLOAD] Reusing asset {asset_urn} for {img_name}")
+            return asset_urn, True
+
+    image_path = os.path.join(UPLOAD_FOLDER, img_name)
+
+    if not os.path.exists(image_path):
+        print(f"[SKIP] Image not found: {image_path}")
+        raise FileNotFoundError(f"Image not found: {img_name}")
+
+    print(f"[UPLOAD] Registering upload for {img_name}")
 
     try:
-        with app.app_context():
-            cursor = mysql.connection.cursor()
-            cursor.execute("""
-                SELECT * FROM scheduled_posts 
-                WHERE DATE(post_date) = CURDATE() AND posted = 0
-            """)
-            posts = cursor.fetchall()
-
-            if not posts:
-                print("No new posts to publish.")
-                cursor.close()
-                return jsonify({
-                    "success": True,
-                    "message": "No new posts to publish.",
-                    "posts_processed": 0
-                }), 200
-
-            print(f"Found {len(posts)} post(s) to publish.")
-
-            successful_posts = []
-            failed_posts = []
-
-            for post in posts:
-                post_id = post["id"]
-                author_urn = post["author_urn"]
-                content = post["content"]
-                
-                # Multiple image support (CSV format)
-                image_field = post.get("image")
-                image_list = [
-                    img.strip() for img in image_field.split(",")
-                    if img.strip()
-                ] if image_field else []
-
-                # Limit max 5
-                image_list = image_list[:5]
-
-                print(f"\nPreparing Post ID={post_id} with {len(image_list)} image(s)")
-
-                # Fetch LinkedIn Access Token
-                cursor.execute("SELECT access_token FROM linkedin_tokens WHERE user_urn = %s", (author_urn,))
-                token_row = cursor.fetchone()
-
-                if not token_row:
-                    print(f"No access token found for author_urn={author_urn}")
-                    failed_posts.append({
-                        "post_id": post_id,
-                        "reason": "No access token found"
-                    })
-                    continue
-
-                access_token = token_row["access_token"]
-
-                headers = {
-                    "Authorization": f"Bearer {access_token}",
-                    "X-Restli-Protocol-Version": "2.0.0"
-                }
+        registration = linkedin.register_upload(access_token, author_urn)
+    except LinkedInAPIError as e:
+        print(f"[REGISTER ERROR] {e.message}")
+        raise
 
-                # === STEP 1: Upload multiple images to LinkedIn ===
-                asset_list = []
-
-                for img_name in image_list:
-                    image_path = os.path.join("static", "uploaded_post_img", img_name)
-
-                    if not os.path.exists(image_path):
-                        print(f"[SKIP] Image not found: {image_path}")
-                        continue
-
-                    print(f"[UPLOAD] Registering upload for {img_name}")
-
-                    register_url = "https://api.linkedin.com/v2/assets?action=registerUpload"
-                    register_body = {
-                        "registerUploadRequest": {
-                            "owner": f"urn:li:person:{author_urn}",
-                            "recipes": ["urn:li:digitalmediaRecipe:feedshare-image"],
-                            "serviceRelationships": [
-                                {"relationshipType": "OWNER", "identifier": "urn:li:userGeneratedContent"}
-                            ]
-                        }
-                    }
-
-                    reg_response = requests.post(
-                        register_url,
-                        headers={**headers, "Content-Type": "application/json"},
-                        json=register_body
-                    )
+    asset_urn = registration.asset_urn
+    print(f"[UPLOAD] Got upload URL for asset {asset_urn}")
 
-                    if reg_response.status_code not in [200, 201]:
-                        print(f"[REGISTER ERROR] {reg_response.text}")
-                        continue
-
-                    reg_json = reg_response.json()
-                    upload_url = reg_json["value"]["uploadMechanism"]["com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest"]["uploadUrl"]
-                    asset_urn = reg_json["value"]["asset"]
-
-                    print(f"[UPLOAD] Got upload URL for asset {asset_urn}")
-
-                    # Upload actual image bytes
-                    with open(image_path, "rb") as img_file:
-                        upload_resp = requests.put(
-                            upload_url,
-                            headers={"Authorization": f"Bearer {access_token}", "Content-Type": "image/jpeg"},
-                            data=img_file
-                        )
-
-                    if upload_resp.status_code in [200, 201]:
-                        print(f"[UPLOAD] Successfully uploaded {img_name}")
-                        asset_list.append(asset_urn)
-                    else:
-                        print(f"[UPLOAD ERROR] {upload_resp.text}")
-
-                # === STEP 2: Prepare LinkedIn Post Body ===
-                media_category = "IMAGE" if asset_list else "NONE"
-
-                data = {
-                    "author": f"urn:li:person:{author_urn}",
-                    "lifecycleState": "PUBLISHED",
-                    "specificContent": {
-                        "com.linkedin.ugc.ShareContent": {
-                            "shareCommentary": {"text": content},
-                            "shareMediaCategory": media_category
-                        }
-                    },
-                    "visibility": {
-                        "com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"
-                    }
-                }
+    # Upload actual image bytes
+    try:
+        with open(image_path, "rb") as img_file:
+            linkedin.upload_asset(access_token, registration.upload_url, img_file, mime_type_for(img_name))
+    except LinkedInAPIError as e:
+        print(f"[UPLOAD ERROR] {e.message}")
+        raise
+
+    print(f"[UPLOAD] Successfully uploaded {img_name}")
+    if content_hash:
+        asset_urn_cache.set((author_urn, content_hash), asset_urn)
+        new_asset_urns.put((author_urn, content_hash, asset_urn))
+    return asset_urn, False
+
+
+def attach_post_images(cursor, posts):
+    """Loads the posts' rows from post_images in one query.
+
+    Sets ``post["images"]`` (filenames) and ``post["image_assets"]`` (staged
+    asset URNs, None where not staged) in position order.
+    """
+    by_id = {}
+    for post in posts:
+        post["images"] = []
+        post["image_assets"] = []
+        by_id[post["id"]] = post
+
+    if by_id:
+        cursor.execute(f"""
+            SELECT post_id, filename, asset_urn FROM post_images
+            WHERE post_id IN ({", ".join(["%s"] * len(by_id))})
+            ORDER BY post_id, position
+        """, tuple(by_id))
+        for row in cursor.fetchall():
+            by_id[row["post_id"]]["images"].append(row["filename"])
+            by_id[row["post_id"]]["image_assets"].append(row["asset_urn"])
+    return posts
+
+
+def post_image_list(post):
+    """The post's image filenames (see attach_post_images), capped at LinkedIn's 5 per post."""
+    return post.get("images", [])[:5]
+
+
+def upload_post_images(image_list, author_urn, access_token, use_cache=True):
+    """Uploads a post's images in parallel.
+
+    Returns ``(asset_urns, failed_images, reused)`` with assets in image order;
+    ``reused`` is True when any asset came from the URN cache.
+    """
+    futures = [
+        image_upload_pool.submit(upload_post_image, img_name, author_urn, access_token, use_cache)
+        for img_name in image_list
+    ]
+
+    # Collect in submission order so the post keeps the user's image order.
+    asset_list = []
+    failed_images = []
+    reused = False
+
+    for img_name, future in zip(image_list, futures):
+        try:
+            asset_urn, from_cache = future.result()
+            asset_list.append(asset_urn)
+            reused = reused or from_cache
+        except Exception as e:
+            failed_images.append({"image": img_name, "error": str(e)})
 
-                # Add all images into media array
-                if asset_list:
-                    data["specificContent"]["com.linkedin.ugc.ShareContent"]["media"] = [
-                        {"status": "READY", "media": asset}
-                        for asset in asset_list
-                    ]
-
-                # === STEP 3: Publish post ===
-                post_response = requests.post(
-                    "https://api.linkedin.com/v2/ugcPosts",
-                    headers={**headers, "Content-Type": "application/json"},
-                    json=data
-                )
+    return asset_list, failed_images, reused
 
-                if post_response.status_code in [200, 201]:
-                    print(f"[SUCCESS] Successfully posted ID={post_id}")
-
-                    cursor.execute("""
-                        UPDATE scheduled_posts 
-                        SET posted = 1,
-                            posted_at = NOW(),
-                            updated_date = NOW(),
-                            updated_by = 'System'
-                        WHERE id = %s
-                    """, (post_id,))
-                    mysql.connection.commit()
-
-                    successful_posts.append({"post_id": post_id, "author_urn": author_urn})
-
-                else:
-                    print(f"[POST ERROR] {post_response.status_code} - {post_response.text}")
-                    failed_posts.append({
-                        "post_id": post_id,
-                        "status_code": post_response.status_code,
-                        "error": post_response.text
-                    })
 
-            cursor.close()
+def staged_asset_urns(post, image_list):
+    """Asset URNs pre-uploaded for this post, or None if absent, incomplete or stale."""
+    staged_at = post.get("assets_staged_at")
+    asset_list = post.get("image_assets", [])[:5]
+    if not staged_at or not asset_list or None in asset_list:
+        return None
+    if staged_at < datetime.now() - timedelta(hours=app.config['ASSET_STAGE_TTL_HOURS']):
+        return None
 
-            print("\nCompleted scheduled post check.\n")
+    return asset_list if len(asset_list) == len(image_list) else None
 
-            return jsonify({
+
+def build_ugc_post(author_urn, content, asset_list):
+    media_category = "IMAGE" if asset_list else "NONE"
+
+    data = {
+        "author": f"urn:li:person:{author_urn}",
+        "lifecycleState": "PUBLISHED",
+        "specificContent": {
+            "com.linkedin.ugc.ShareContent": {
+                "shareCommentary": {"text": content},
+                "shareMediaCategory": media_category
+            }
+        },
+        "visibility": {
+            "com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"
+        }
+    }
+
+    # Add all images into media array
+    if asset_list:
+        data["specificContent"]["com.linkedin.ugc.ShareContent"]["media"] = [
+            {"status": "READY", "media": asset}
+            for asset in asset_list
+        ]
+    return data
+
+
+def stage_post_assets(job):
+    """Pre-uploads one upcoming post's images; runs on a dispatch worker thread."""
+    post = job["post"]
+    image_list = post_image_list(post)
+    print(f"[STAGE] Pre-uploading {len(image_list)} image(s) for Post ID={post['id']}")
+
+    # Always a fresh upload: assets_staged_at is stamped afterwards, so a reused
+    # (older) URN would be passed off as staged just now.
+    asset_list, failed_images, _reused = upload_post_images(
+        image_list, post["author_urn"], job["access_token"], use_cache=False
+    )
+    if failed_images:
+        return {"success": False, "post_id": post["id"], "failed_images": failed_images}
+    return {"success": True, "post_id": post["id"], "asset_urns": asset_list}
+
+
+def request_never_sent(error):
+    """True for connect-phase failures, where LinkedIn never received the request.
+
+    A read timeout or a connection dropped mid-response may have come after
+    LinkedIn acted on it, so those return False.
+    """
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+def publish_scheduled_post(job):
+    """Publishes one scheduled post (text + up to 5 images) to LinkedIn.
+
+    Runs on a dispatch worker thread, so it only talks to LinkedIn and never
+    touches the database; the caller records the outcome. A failed result's
+    ``definite`` flag is True when LinkedIn cannot have created the share.
+    """
+    post = job["post"]
+    access_token = job["access_token"]
+
+    post_id = post["id"]
+    author_urn = post["author_urn"]
+    content = post["content"]
+    image_list = post_image_list(post)
+
+    print(f"\nPreparing Post ID={post_id} with {len(image_list)} image(s)")
+
+    # === STEP 1: Use pre-staged assets, or upload the images now (in parallel) ===
+    asset_list = staged_asset_urns(post, image_list)
+    reused_assets = asset_list is not None
+    failed_images = []
+
+    if reused_assets:
+        print(f"[STAGE] Using {len(asset_list)} pre-uploaded asset(s) for Post ID={post_id}")
+    else:
+        asset_list, failed_images, reused_assets = upload_post_images(image_list, author_urn, access_token)
+
+    # === STEP 2: Prepare LinkedIn Post Body ===
+    data = build_ugc_post(author_urn, content, asset_list)
+
+    # === STEP 3: Publish post ===
+    try:
+        try:
+            post_urn = linkedin.create_ugc_post(access_token, data)
+        except LinkedInAPIError as e:
+            if not reused_assets or e.status_code not in (400, 404, 422):
+                raise
+            # Staged or cached assets can be rejected once LinkedIn expires them; upload afresh once.
+            print(f"[STAGE] Reused assets rejected ({e.status_code}); re-uploading for Post ID={post_id}")
+            asset_list, failed_images, _reused = upload_post_images(
+                image_list, author_urn, access_token, use_cache=False
+            )
+            post_urn = linkedin.create_ugc_post(access_token, build_ugc_post(author_urn, content, asset_list))
+        print(f"[SUCCESS] Successfully posted ID={post_id}")
+        result = {"success": True, "post_id": post_id, "author_urn": author_urn, "post_urn": post_urn}
+    except LinkedInRateLimited as e:
+        # Raised by our own throttle before the request went out.
+        print(f"[POST ERROR] {e.message}")
+        result = {"success": False, "post_id": post_id, "status_code": 429, "error": e.message, "definite": True}
+    except LinkedInAPIError as e:
+        print(f"[POST ERROR] {e.status_code} - {e.body or e.message}")
+        result = {
+            "success": False,
+            "post_id": post_id,
+            "status_code": e.status_code,
+            "error": e.body or e.message,
+            # A 4xx means LinkedIn refused the share; a 5xx may still have created it.
+            "definite": 400 <= e.status_code < 500
+        }
+    except requests.RequestException as e:
+        print(f"[POST ERROR] {e}")
+        result = {"success": False, "post_id": post_id, "error": str(e), "definite": request_never_sent(e)}
+
+    if failed_images:
+        result["failed_images"] = failed_images
+    return result
+
+
+def bump_post_counters(cursor, author_urn, added=0, published=0):
+    """Adjusts an author's post_counters row in the caller's transaction.
+
+    ``added`` new posts start out scheduled; ``published`` posts move from
+    scheduled to published.
+    """
+    if not author_urn:
+        return
+    cursor.execute("""
+        INSERT INTO post_counters (author_urn, total_posts, scheduled_posts, published_posts, updated_at)
+        VALUES (%s, %s, %s, %s, NOW())
+        ON DUPLICATE KEY UPDATE
+            total_posts = total_posts + VALUES(total_posts),
+            scheduled_posts = scheduled_posts + VALUES(scheduled_posts),
+            published_posts = published_posts + VALUES(published_posts),
+            updated_at = NOW()
+    """, (author_urn, added, added - published, published))
+
+
+def load_access_tokens(cursor, author_urns):
+    """Returns {author_urn: access_token} for the given authors in a single query."""
+    author_urns = [urn for urn in author_urns if urn]
+    if not author_urns:
+        return {}
+
+    placeholders = ", ".join(["%s"] * len(author_urns))
+    cursor.execute(f"""
+        SELECT user_urn, access_token FROM linkedin_tokens
+        WHERE user_urn IN ({placeholders}) AND access_token IS NOT NULL
+    """, tuple(author_urns))
+    return {row["user_urn"]: row["access_token"] for row in cursor.fetchall()}
+
+
+def publish_retry_delay(attempts):
+    return min(app.config['PUBLISH_RETRY_BASE_SECONDS'] * 2 ** max(0, attempts - 1), 3600)
+
+
+def record_publish_failure(cursor, job, worker_id, error, status_code=None, definite=True):
+    """Puts a failed job back for a retry, or parks it as failed / in doubt.
+
+    ``definite`` failures (LinkedIn rejected the call with a 4xx, or we never
+    called it) are retried with backoff up to PUBLISH_MAX_ATTEMPTS. Anything
+    else may have created the post, so it is only retried when
+    PUBLISH_RETRY_IN_DOUBT is set.
+    """
+    if not definite and not app.config['PUBLISH_RETRY_IN_DOUBT']:
+        status, outcome = outbox.IN_DOUBT, outbox.IN_DOUBT
+    elif job["attempts"] >= app.config['PUBLISH_MAX_ATTEMPTS']:
+        status, outcome = outbox.FAILED, outbox.FAILED
+    else:
+        status, outcome = outbox.PENDING, "retry"
+
+    return outbox.record_outcome(
+        cursor, job, worker_id, status, outcome,
+        error=str(error)[:2000], status_code=status_code,
+        retry_in=publish_retry_delay(job["attempts"]) if status == outbox.PENDING else 0
+    )
+
+
+def dispatch_due_posts(shard=None):
+    """Publishes every due post through the publish outbox and returns the run summary.
+
+    Needs an app context. Due posts are enqueued into publish_jobs and then
+    claimed under a lease, so overlapping runs (another worker, a cron retry)
+    never publish the same post twice; within a process runs are also
+    serialised so they don't compete for the same threads. ``shard`` is an
+    ``(index, count)`` pair restricting the run to one slice of authors.
+    """
+    with dispatch_lock:
+        print(f"[{datetime.now()}] Checking for posts to publish...")
+        run_started = time.perf_counter()
+        worker_id = outbox.new_worker_id()
+
+        cursor = mysql.connection.cursor()
+        outbox.enqueue_due(cursor, app.config['DISPATCH_MAX_LATENESS_HOURS'])
+        expired = outbox.expire_leases(cursor, app.config['PUBLISH_RETRY_IN_DOUBT'])
+        if expired:
+            print(f"[DISPATCH] Released {expired} job(s) whose lease expired.")
+        mysql.connection.commit()
+
+        claimed = outbox.claim(
+            cursor, worker_id, app.config['PUBLISH_CLAIM_BATCH'], app.config['PUBLISH_LEASE_SECONDS'],
+            shard=shard
+        )
+        mysql.connection.commit()
+        posts = attach_post_images(cursor, claimed)
+
+        if not posts:
+            print("No new posts to publish.")
+            cursor.close()
+            return {
                 "success": True,
-                "message": "Scheduled posts processing completed.",
-                "total_posts": len(posts),
-                "successful": len(successful_posts),
-                "failed": len(failed_posts),
-                "successful_posts": successful_posts,
-                "failed_posts": failed_posts
-            }), 200
+                "message": "No new posts to publish.",
+                "posts_processed": 0
+            }
+
+        print(f"Claimed {len(posts)} post(s) to publish as {worker_id}.")
+
+        successful_posts = []
+        failed_posts = []
+        in_doubt_posts = []
+        jobs = []
+
+        # Fetch every author's LinkedIn Access Token in one query
+        tokens = load_access_tokens(cursor, {post["author_urn"] for post in posts})
+
+        for post in posts:
+            access_token = tokens.get(post["author_urn"])
+
+            if not access_token:
+                print(f"No access token found for author_urn={post['author_urn']}")
+                record_publish_failure(cursor, post, worker_id, "No access token found")
+                failed_posts.append({
+                    "post_id": post["id"],
+                    "reason": "No access token found"
+                })
+                continue
+
+            jobs.append({"post": post, "access_token": access_token})
+        mysql.connection.commit()
+
+        warm_asset_urn_cache(cursor, [job["post"] for job in jobs])
+
+        # Network work runs concurrently; database writes stay on this thread.
+        engine = DispatchEngine(
+            max_workers=app.config['DISPATCH_MAX_WORKERS'],
+            per_token_limit=app.config['DISPATCH_PER_TOKEN_LIMIT']
+        )
+        results = engine.run(jobs, publish_scheduled_post)
+
+        if save_new_asset_urns(cursor):
+            mysql.connection.commit()
+
+        for job, result in zip(jobs, results):
+            post = job["post"]
+            post_id = post["id"]
+            result.setdefault("post_id", post_id)
+
+            if result.pop("success"):
+                recorded = outbox.record_outcome(
+                    cursor, post, worker_id, outbox.PUBLISHED, outbox.PUBLISHED,
+                    post_urn=result.get("post_urn")
+                )
+                cursor.execute("""
+                    UPDATE scheduled_posts 
+                    SET posted = 1,
+                        posted_at = NOW(),
+                        updated_date = NOW(),
+                        updated_by = 'System'
+                    WHERE id = %s AND posted = 0
+                """, (post_id,))
+                if cursor.rowcount:
+                    bump_post_counters(cursor, post["author_urn"], published=1)
+                if not recorded:
+                    print(f"[DISPATCH] Lease on Post ID={post_id} expired before it was recorded as published")
+                mysql.connection.commit()
+
+                successful_posts.append(result)
+                continue
+
+            status_code = result.get("status_code")
+            # Unclassified errors (anything publish_scheduled_post didn't catch) may
+            # have happened after the share was sent.
+            definite = result.pop("definite", False)
+            record_publish_failure(
+                cursor, post, worker_id, result.get("error") or result.get("reason"),
+                status_code=status_code, definite=definite
+            )
+            mysql.connection.commit()
+
+            if definite or app.config['PUBLISH_RETRY_IN_DOUBT']:
+                failed_posts.append(result)
+            else:
+                in_doubt_posts.append(result)
+
+        cursor.close()
+
+        print("\nCompleted scheduled post check.\n")
+
+        return {
+            "success": True,
+            "message": "Scheduled posts processing completed.",
+            "total_posts": len(posts),
+            "successful": len(successful_posts),
+            "failed": len(failed_posts),
+            "in_doubt": len(in_doubt_posts),
+            "successful_posts": successful_posts,
+            "failed_posts": failed_posts,
+            "in_doubt_posts": in_doubt_posts,
+            "elapsed_ms": round((time.perf_counter() - run_started) * 1000, 1)
+        }
+
+
+def dispatch_all_due_posts(shard=None, stop=None):
+    """Runs dispatch_due_posts until a claim comes back short of a full batch.
+
+    Each run claims at most PUBLISH_CLAIM_BATCH posts, so a backlog (every
+    generated post defaults to the same time of day) is drained here in one
+    call instead of one batch per wakeup. ``stop`` is an optional Event
+    checked between batches. Returns the combined summary.
+    """
+    summary = {"success": True, "batches": 0, "total_posts": 0, "successful": 0, "failed": 0,
+               "in_doubt": 0, "successful_posts": [], "failed_posts": [], "in_doubt_posts": []}
+    run_started = time.perf_counter()
+
+    while True:
+        batch = dispatch_due_posts(shard=shard)
+        summary["batches"] += 1
+        for key in ("total_posts", "successful", "failed", "in_doubt"):
+            summary[key] += batch.get(key, 0)
+        for key in ("successful_posts", "failed_posts", "in_doubt_posts"):
+            summary[key].extend(batch.get(key, []))
+
+        if batch.get("total_posts", 0) < app.config['PUBLISH_CLAIM_BATCH'] or (stop and stop.is_set()):
+            break
+
+    summary["message"] = ("Scheduled posts processing completed." if summary["total_posts"]
+                          else "No new posts to publish.")
+    summary["elapsed_ms"] = round((time.perf_counter() - run_started) * 1000, 1)
+    return summary
+
+
+def stage_upcoming_assets(shard=None):
+    """Pre-uploads images of posts due within ASSET_STAGE_AHEAD_HOURS.
+
+    Needs an app context. Posts whose staged assets are older than
+    ASSET_STAGE_TTL_HOURS are staged again, so at publish time a post with
+    images is a single ugcPosts call. ``shard`` works as in dispatch_due_posts.
+
+    Every serving process runs this job, so each post is claimed by stamping
+    assets_staged_at before its images are uploaded; only the process whose
+    stamp lands uploads them.
+    """
+    shard_sql, shard_params = outbox.shard_clause(shard)
+    cursor = mysql.connection.cursor()
+    cursor.execute(f"""
+        SELECT id, author_urn, assets_staged_at FROM scheduled_posts sp
+        WHERE posted = 0
+          AND post_date > NOW()
+          AND post_date <= NOW() + INTERVAL %s HOUR
+          AND EXISTS (SELECT 1 FROM post_images pi WHERE pi.post_id = sp.id)
+          AND (assets_staged_at IS NULL OR assets_staged_at < NOW() - INTERVAL %s HOUR){shard_sql}
+        ORDER BY post_date
+        LIMIT %s
+    """, (app.config['ASSET_STAGE_AHEAD_HOURS'],
+          app.config['ASSET_STAGE_TTL_HOURS'] // 2,
+          *shard_params,
+          app.config['ASSET_STAGE_BATCH_SIZE']))
+    candidates = list(cursor.fetchall())
+
+    # Compare-and-set on the value just read: a concurrent stager that got
+    # there first has changed it, so the UPDATE matches nothing for us.
+    claimed = []
+    for post in candidates:
+        cursor.execute("""
+            UPDATE scheduled_posts SET assets_staged_at = NOW()
+            WHERE id = %s AND posted = 0 AND assets_staged_at <=> %s
+        """, (post["id"], post["assets_staged_at"]))
+        if cursor.rowcount:
+            claimed.append(post)
+    mysql.connection.commit()
+
+    # Claimed posts carry the new stamp, but their URNs are only trusted once
+    # the upload below has finished, so clear it on the in-memory copies.
+    for post in claimed:
+        post["assets_staged_at"] = None
+    posts = attach_post_images(cursor, claimed)
+
+    if not posts:
+        cursor.close()
+        return 0
+
+    tokens = load_access_tokens(cursor, {post["author_urn"] for post in posts})
+    jobs = [
+        {"post": post, "access_token": tokens[post["author_urn"]]}
+        for post in posts if tokens.get(post["author_urn"])
+    ]
+    unstaged = [post["id"] for post in posts if not tokens.get(post["author_urn"])]
+
+    engine = DispatchEngine(
+        max_workers=app.config['DISPATCH_MAX_WORKERS'],
+        per_token_limit=app.config['DISPATCH_PER_TOKEN_LIMIT']
+    )
+    staged = 0
+    for job, result in zip(jobs, engine.run(jobs, stage_post_assets)):
+        if not result.get("success"):
+            print(f"[STAGE] Could not stage Post ID={job['post']['id']}: {result}")
+            unstaged.append(job["post"]["id"])
+            continue
+        cursor.executemany("""
+            UPDATE post_images SET asset_urn = %s
+            WHERE post_id = %s AND position = %s
+        """, [
+            (asset_urn, result["post_id"], position)
+            for position, asset_urn in enumerate(result["asset_urns"])
+        ])
+        cursor.execute("""
+            UPDATE scheduled_posts SET assets_staged_at = NOW()
+            WHERE id = %s AND posted = 0
+        """, (result["post_id"],))
+        staged += 1
+
+    # Release the claim on posts that were not staged so the next run retries them.
+    cursor.executemany(
+        "UPDATE scheduled_posts SET assets_staged_at = NULL WHERE id = %s",
+        [(post_id,) for post_id in unstaged]
+    )
+    save_new_asset_urns(cursor)
+    mysql.connection.commit()
+    cursor.close()
+    print(f"[STAGE] Pre-uploaded assets for {staged} post(s).")
+    return staged
+
+
+@app.route('/run_scheduled_posts')
+def run_scheduled_posts():
+    """Background job to post scheduled content (text + up to 5 images) to LinkedIn"""
+    try:
+        with app.app_context():
+            return jsonify(dispatch_all_due_posts()), 200
 
     except Exception as e:
         print(f"\n[EXCEPTION] {str(e)}")
@@ -583,9 +1120,483 @@ def run_scheduled_posts():
             "message": "Error during scheduled posting."
         }), 500
 
+
+# ================================
+# IN-PROCESS PUBLISHING SCHEDULER
+# ================================
+def load_due_heap():
+    """Reloads the wakeup heap with the next upcoming publish times (index range scan)."""
+    cur = mysql.connection.cursor()
+    cur.execute("""
+        SELECT post_date FROM scheduled_posts
+        WHERE posted = 0 AND post_date > NOW()
+        ORDER BY post_date
+        LIMIT %s
+    """, (app.config['SCHEDULER_HEAP_SIZE'],))
+    rows = cur.fetchall()
+    cur.close()
+    due_heap.reload([row["post_date"] for row in rows])
+
+
+def scheduled_dispatch():
+    """Scheduler wakeup: publish whatever is due, then sleep until the next post."""
+    with app.app_context():
+        try:
+            dispatch_all_due_posts()
+        except Exception as e:
+            print(f"[SCHEDULER ERROR] {e}")
+            print(traceback.format_exc())
+        finally:
+            load_due_heap()
+
+
+def scheduled_staging():
+    """Scheduler job: pre-upload images for posts coming up soon."""
+    with app.app_context():
+        try:
+            stage_upcoming_assets()
+        except Exception as e:
+            print(f"[STAGE ERROR] {e}")
+            print(traceback.format_exc())
+
+
+def notify_schedule_changed(post_date):
+    """Called after posts are added or rescheduled; wakes the scheduler earlier if needed."""
+    if scheduler.running:
+        due_heap.push(post_date)
+
+
+due_heap = DueHeap(scheduler, scheduled_dispatch, max_sleep=app.config['SCHEDULER_MAX_SLEEP_SECONDS'])
+scheduler_start_lock = threading.Lock()
+
+
+@app.before_request
+def start_scheduler():
+    """Starts the scheduler on the first request a serving process handles.
+
+    Starting here rather than at import keeps it out of CLI commands and out of
+    the debug reloader's watcher process.
+    """
+    if not app.config['SCHEDULER_ENABLED'] or scheduler.running:
+        return
+    with scheduler_start_lock:
+        if scheduler.running:
+            return
+        scheduler.start()
+        scheduler.add_job(
+            scheduled_staging, "interval", minutes=app.config['ASSET_STAGE_INTERVAL_MINUTES'],
+            id="stage_upcoming_assets", replace_existing=True, next_run_time=datetime.now()
+        )
+        try:
+            load_due_heap()
+        except Exception as e:
+            print(f"[SCHEDULER ERROR] Could not load due posts: {e}")
+            due_heap.reload([])
+        print("[SCHEDULER] In-process publishing scheduler started.")
+
+# ================================
+# GENERATION DRAFTS
+# ================================
+def save_draft(daywise_content, draft_id=None, pending_generation=None):
+    """Stores generated day-wise content server-side and returns its draft ID.
+
+    Only the ID travels in the session cookie. ``pending_generation`` holds the
+    form parameters of a streamed generation until /generate_stream takes
+    them. Expired drafts are purged on every save so the table stays small.
+    """
+    draft_id = draft_id or secrets.token_hex(16)
+    pending = json.dumps(pending_generation) if pending_generation is not None else None
+    cur = mysql.connection.cursor()
+    cur.execute("DELETE FROM generation_drafts WHERE expires_at < NOW()")
+    cur.execute("""
+        INSERT INTO generation_drafts (id, user_id, content, pending_generation, created_at, expires_at)
+        VALUES (%s, %s, %s, %s, NOW(), NOW() + INTERVAL %s HOUR)
+        ON DUPLICATE KEY UPDATE content = VALUES(content),
+                                pending_generation = VALUES(pending_generation),
+                                expires_at = VALUES(expires_at)
+    """, (draft_id, session['user_id'], json.dumps(daywise_content), pending, app.config['DRAFT_TTL_HOURS']))
+    mysql.connection.commit()
+    cur.close()
+    return draft_id
+
+
+def load_draft(draft_id):
+    """Returns the signed-in user's unexpired draft content, or None."""
+    cur = mysql.connection.cursor()
+    cur.execute("""
+        SELECT content FROM generation_drafts
+        WHERE id = %s AND user_id = %s AND expires_at > NOW()
+    """, (draft_id, session['user_id']))
+    row = cur.fetchone()
+    cur.close()
+    return json.loads(row['content']) if row else None
+
+
+def take_pending_generation(draft_id):
+    """Returns and clears a draft's pending generation parameters, or None.
+
+    Clearing is a conditional UPDATE, so an EventSource reconnect (or a second
+    tab) cannot start the same generation twice.
+    """
+    cur = mysql.connection.cursor()
+    cur.execute("""
+        SELECT pending_generation FROM generation_drafts
+        WHERE id = %s AND user_id = %s AND expires_at > NOW() AND pending_generation IS NOT NULL
+    """, (draft_id, session['user_id']))
+    row = cur.fetchone()
+    if not row:
+        cur.close()
+        return None
+
+    cur.execute("""
+        UPDATE generation_drafts SET pending_generation = NULL
+        WHERE id = %s AND user_id = %s AND pending_generation IS NOT NULL
+    """, (draft_id, session['user_id']))
+    taken = cur.rowcount
+    mysql.connection.commit()
+    cur.close()
+    return json.loads(row['pending_generation']) if taken else None
+
+
+def delete_draft(draft_id):
+    cur = mysql.connection.cursor()
+    cur.execute("DELETE FROM generation_drafts WHERE id = %s AND user_id = %s", (draft_id, session['user_id']))
+    mysql.connection.commit()
+    cur.close()
+
 # ================================
 # MAIN CONTENT GENERATION ROUTES
 # ================================
+GENERATION_SYSTEM_MESSAGE = (
+    "You are a professional LinkedIn content writer who understands tone, structure, and engagement psychology. "
+    "Create a single LinkedIn post that aligns with the user's provided details."
+)
+
+
+def max_output_tokens_for(content_length):
+    return (
+        800 if content_length.lower() == "short"
+        else 2000 if content_length.lower() == "medium"
+        else 3000
+    )
+
+
+BATCH_SYSTEM_MESSAGE = (
+    "You are a professional LinkedIn content writer who understands tone, structure, and engagement psychology. "
+    "Create one distinct LinkedIn post for each scheduled date below, all aligned with the user's provided details. "
+    "Vary the hook and angle from day to day so the series does not repeat itself."
+)
+
+PROMPT_REQUIREMENTS = (
+    "\nRequirements:\n"
+    "- Keep the post under 3000 characters.\n"
+    "- Use an engaging hook, concise body (1–3 short paragraphs), and a CTA if relevant.\n"
+    "- Maintain natural LinkedIn tone and readability.\n"
+    "- Return final content as plain text only (no formatting tags or markdown).\n"
+)
+
+
+def build_prompt_details(fields):
+    """The user-provided context lines shared by the per-day and batch prompts."""
+    hashtags_instruction = fields["hashtags"].strip() if fields["hashtags"] else ''
+
+    prompt_body = f"Topic / Context: {fields['topic_context']}\n"
+    prompt_body += f"Purpose / Goal: {fields['purpose_goal']}\n"
+    prompt_body += f"Target Audience: {fields['target_audience']}\n"
+    prompt_body += f"Tone of Voice: {fields['tone_of_voice']}\n"
+    prompt_body += f"Formatting Preference: {fields['formatting'] or 'Short and story format'}\n"
+    if fields["cta"]:
+        prompt_body += f"Optional Call-to-Action (CTA): {fields['cta']}\n"
+    if fields["keywords"]:
+        prompt_body += f"Keywords to Emphasize: {fields['keywords']}\n"
+    if hashtags_instruction:
+        prompt_body += f"Hashtags (use these): {hashtags_instruction}\n"
+    else:
+        prompt_body += "Hashtags: Please generate 4–6 relevant hashtags automatically at the end.\n"
+    if fields["user_prompt"]:
+        prompt_body += f"Additional Instructions: {fields['user_prompt']}\n"
+
+    return prompt_body
+
+
+def build_day_prompt(scheduled_date, fields):
+    """Builds the full Gemini prompt for one scheduled day from the generator form fields."""
+    prompt_body = f"\n\nSCHEDULED DATE: {scheduled_date.strftime('%A, %B %d, %Y')}\n"
+    prompt_body += build_prompt_details(fields)
+    prompt_body += PROMPT_REQUIREMENTS
+
+    return f"{GENERATION_SYSTEM_MESSAGE}{prompt_body}"
+
+
+def build_batch_prompt(schedule_items, fields):
+    """Builds one Gemini prompt asking for a post per scheduled date, context stated once."""
+    prompt_body = "\n\nSCHEDULED DATES:\n"
+    for scheduled_date in schedule_items:
+        prompt_body += f"- {scheduled_date.strftime('%Y-%m-%d')} ({scheduled_date.strftime('%A, %B %d, %Y')})\n"
+    prompt_body += build_prompt_details(fields)
+    prompt_body += PROMPT_REQUIREMENTS
+    prompt_body += (
+        "- Apply these requirements to each post separately.\n"
+        "- Respond with a JSON object whose keys are the scheduled dates (YYYY-MM-DD) "
+        "and whose values are the post for that date.\n"
+    )
+
+    return f"{BATCH_SYSTEM_MESSAGE}{prompt_body}"
+
+
+def clean_generated_text(text_output):
+    """Strips boilerplate the model likes to add around a post."""
+    text_output = text_output.strip()
+    for bad_phrase in [
+        "Here's a possible LinkedIn post, ready to copy and paste:",
+        "HASHTAGS:",
+        "Hashtags:",
+        "**HASHTAGS:**"
+    ]:
+        text_output = text_output.replace(bad_phrase, "")
+    return text_output.strip()
+
+
+def day_post(scheduled_date, text_output, html_output=None):
+    return {
+        "date": scheduled_date.strftime("%Y-%m-%d"),
+        "text": text_output,
+        "html": text_output if html_output is None else html_output
+    }
+
+
+def generation_cache_key(contents, max_output_tokens):
+    return GenerationCache.key_for(GEMINI_TEXT_MODEL, contents, {
+        "max_output_tokens": max_output_tokens,
+        "temperature": GENERATION_TEMPERATURE
+    })
+
+
+def cached_day_post(scheduled_date, cache_key):
+    """Returns the cached post for this exact prompt, or None."""
+    cached = generation_cache.get(cache_key)
+    if cached is None:
+        return None
+    print(f"[DEBUG] Cache hit for {scheduled_date.strftime('%Y-%m-%d')}")
+    return day_post(scheduled_date, cached["text"], cached["html"])
+
+
+def generate_day_post(scheduled_date, contents, max_output_tokens, use_cache=True):
+    """Generates one day's post; never raises, falling back to placeholder text."""
+    cache_key = generation_cache_key(contents, max_output_tokens)
+    if use_cache:
+        cached = cached_day_post(scheduled_date, cache_key)
+        if cached:
+            return cached
+
+    print(f"[DEBUG] Generating content for {scheduled_date.strftime('%Y-%m-%d')}...")
+
+    try:
+        response = client.models.generate_content(
+            model=GEMINI_TEXT_MODEL,
+            contents=contents,
+            config=types.GenerateContentConfig(
+                max_output_tokens=max_output_tokens,
+                temperature=GENERATION_TEMPERATURE
+            )
+        )
+
+        if response and response.text:
+            text_output = clean_generated_text(response.text)
+            html_output = markdown.markdown(text_output, extensions=['extra', 'smarty'])
+            print(f"[DEBUG] Generated for {scheduled_date.strftime('%Y-%m-%d')} ({len(text_output)} chars)")
+            # Placeholders are never cached, so failures are retried next time.
+            generation_cache.set(cache_key, {"text": text_output, "html": html_output})
+            return day_post(scheduled_date, text_output, html_output)
+
+        print(f"[WARN] Empty response for {scheduled_date.strftime('%Y-%m-%d')}")
+        return day_post(scheduled_date, "(No content generated)")
+
+    except Exception as gen_err:
+        safe_error = str(gen_err).encode("utf-8", "ignore").decode("utf-8", "ignore")
+        print(f"[ERROR] Generation failed for {scheduled_date.strftime('%Y-%m-%d')}: {safe_error}")
+        return day_post(scheduled_date, "(Error generating this day's content)")
+
+
+def generate_batch_posts(schedule_items, fields, max_output_tokens, use_cache=True):
+    """Asks Gemini for several days in one structured call.
+
+    Returns {scheduled_date: day_post} for every date whose entry came back as
+    non-empty text; dates that are missing or malformed are simply left out
+    so the caller can fall back to per-day calls for them. Never raises.
+    """
+    dates = [d.strftime("%Y-%m-%d") for d in schedule_items]
+    contents = build_batch_prompt(schedule_items, fields)
+    cache_key = GenerationCache.key_for(GEMINI_TEXT_MODEL, contents, {
+        "max_output_tokens": max_output_tokens,
+        "temperature": GENERATION_TEMPERATURE,
+        "response_schema": dates
+    })
+
+    posts_by_date = generation_cache.get(cache_key) if use_cache else None
+    if posts_by_date is None:
+        print(f"[DEBUG] Batch generating {dates[0]}..{dates[-1]} ({len(dates)} days)...")
+        try:
+            response = client.models.generate_content(
+                model=GEMINI_TEXT_MODEL,
+                contents=contents,
+                config=types.GenerateContentConfig(
+                    max_output_tokens=max_output_tokens,
+                    temperature=GENERATION_TEMPERATURE,
+                    response_mime_type="application/json",
+                    response_schema=types.Schema(
+                        type=types.Type.OBJECT,
+                        properties={date: types.Schema(type=types.Type.STRING) for date in dates},
+                        required=dates,
+                        property_ordering=dates
+                    )
+                )
+            )
+            posts_by_date = json.loads(response.text or "")
+        except Exception as gen_err:
+            safe_error = str(gen_err).encode("utf-8", "ignore").decode("utf-8", "ignore")
+            print(f"[WARN] Batch generation unusable, falling back to per-day calls: {safe_error}")
+            return {}
+
+        if not isinstance(posts_by_date, dict):
+            print("[WARN] Batch generation returned a non-object, falling back to per-day calls")
+            return {}
+
+    results = {}
+    valid = {}
+    for scheduled_date, date in zip(schedule_items, dates):
+        text = posts_by_date.get(date)
+        if not isinstance(text, str) or not clean_generated_text(text):
+            continue
+        text_output = clean_generated_text(text)
+        html_output = markdown.markdown(text_output, extensions=['extra', 'smarty'])
+        results[scheduled_date] = day_post(scheduled_date, text_output, html_output)
+        valid[date] = text
+
+    # Only a complete reply is cached; a partial one would short-circuit retries.
+    if len(valid) == len(dates):
+        generation_cache.set(cache_key, valid)
+    return results
+
+
+def batch_chunks(schedule_items, max_output_tokens):
+    """Splits the schedule into batch-call chunks, or returns [] when batching doesn't apply.
+
+    Each day keeps the full ``max_output_tokens`` so long posts are not cut off
+    mid-JSON; a GEMINI_BATCH_MAX_OUTPUT_TOKENS budget too small for two such
+    posts gains nothing from batching.
+    """
+    chunk_size = app.config['GEMINI_BATCH_MAX_OUTPUT_TOKENS'] // max_output_tokens
+    if not app.config['GEMINI_BATCH_GENERATION'] or len(schedule_items) < 2 or chunk_size < 2:
+        return []
+    return [schedule_items[i:i + chunk_size] for i in range(0, len(schedule_items), chunk_size)]
+
+
+def generate_schedule(schedule_items, fields, max_output_tokens, use_cache=True):
+    """Generates every scheduled day's post and returns them in date order.
+
+    With GEMINI_BATCH_GENERATION on, days are requested in as few structured
+    calls as the output-token budget allows (see batch_chunks); any day the
+    batch reply did not cover is then generated on its own. All calls share
+    one bounded pool.
+    """
+    results = {}
+
+    with ThreadPoolExecutor(
+        max_workers=min(app.config['GEMINI_MAX_WORKERS'], len(schedule_items)),
+        thread_name_prefix="gemini"
+    ) as pool:
+        for chunk_results in pool.map(
+            lambda chunk: generate_batch_posts(chunk, fields, max_output_tokens * len(chunk), use_cache),
+            batch_chunks(schedule_items, max_output_tokens)
+        ):
+            results.update(chunk_results)
+
+        missing = [d for d in schedule_items if d not in results]
+        if missing and len(missing) < len(schedule_items):
+            print(f"[DEBUG] Falling back to per-day generation for {len(missing)} day(s)")
+
+        # Each remaining day is an independent Gemini call; map() keeps date order.
+        for scheduled_date, post in zip(missing, pool.map(
+            lambda d: generate_day_post(d, build_day_prompt(d, fields), max_output_tokens, use_cache),
+            missing
+        )):
+            results[scheduled_date] = post
+
+    return [results[d] for d in schedule_items]
+
+
+def stream_day_post(index, scheduled_date, contents, max_output_tokens, emit, use_cache=True):
+    """Streams one day's post token-by-token through ``emit(event, data)``.
+
+    Sends ``delta`` events as chunks arrive and a final ``day`` event carrying
+    the cleaned text and HTML (or the usual placeholder on failure). A cache
+    hit skips straight to the ``day`` event.
+    """
+    cache_key = generation_cache_key(contents, max_output_tokens)
+    if use_cache:
+        cached = cached_day_post(scheduled_date, cache_key)
+        if cached:
+            emit("day", {"index": index, **cached})
+            return cached
+
+    print(f"[DEBUG] Streaming content for {scheduled_date.strftime('%Y-%m-%d')}...")
+    chunks = []
+
+    try:
+        for chunk in client.models.generate_content_stream(
+            model=GEMINI_TEXT_MODEL,
+            contents=contents,
+            config=types.GenerateContentConfig(
+                max_output_tokens=max_output_tokens,
+                temperature=GENERATION_TEMPERATURE
+            )
+        ):
+            if chunk.text:
+                chunks.append(chunk.text)
+                emit("delta", {"index": index, "text": chunk.text})
+
+        text_output = clean_generated_text("".join(chunks))
+        if text_output:
+            html_output = markdown.markdown(text_output, extensions=['extra', 'smarty'])
+            generation_cache.set(cache_key, {"text": text_output, "html": html_output})
+            result = day_post(scheduled_date, text_output, html_output)
+        else:
+            print(f"[WARN] Empty response for {scheduled_date.strftime('%Y-%m-%d')}")
+            result = day_post(scheduled_date, "(No content generated)")
+
+    except Exception as gen_err:
+        safe_error = str(gen_err).encode("utf-8", "ignore").decode("utf-8", "ignore")
+        print(f"[ERROR] Generation failed for {scheduled_date.strftime('%Y-%m-%d')}: {safe_error}")
+        result = day_post(scheduled_date, "(Error generating this day's content)")
+
+    emit("day", {"index": index, **result})
+    return result
+
+
+def stream_batch_chunk(first_index, chunk, fields, max_output_tokens, emit, use_cache=True):
+    """Generates one batch chunk and emits a ``day`` event per post once its JSON is parsed.
+
+    A structured reply is only usable once complete, so batched days arrive
+    whole rather than token by token; days the reply missed are then streamed
+    one by one as usual. Returns the chunk's posts in date order.
+    """
+    batch = generate_batch_posts(chunk, fields, max_output_tokens * len(chunk), use_cache)
+    results = []
+    for index, scheduled_date in enumerate(chunk, start=first_index):
+        result = batch.get(scheduled_date)
+        if result:
+            emit("day", {"index": index, **result})
+        else:
+            result = stream_day_post(index, scheduled_date, build_day_prompt(scheduled_date, fields),
+                                     max_output_tokens, emit, use_cache)
+        results.append(result)
+    return results
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.route('/', methods=['GET', 'POST'])
 @login_required
 def generate_text():
@@ -614,6 +1625,8 @@ def generate_text():
         cta = request.form.get('cta')
         hashtags = request.form.get('hashtags')
         user_prompt = request.form.get('prompt')
+        # "Generate fresh" checkbox bypasses the generation cache
+        use_cache = request.form.get('fresh') != '1'
 
         # Validation
         if not client:
@@ -629,7 +1642,6 @@ def generate_text():
 
         try:
             start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
-            daywise_content = []
 
             schedule_map = {
                 "Single Day": 1,
@@ -643,95 +1655,38 @@ def generate_text():
 
             schedule_items = [start_date + timedelta(days=i) for i in range(num_days)]
 
-            for scheduled_date in schedule_items:
-                hashtags_instruction = hashtags.strip() if hashtags else ''
-
-                system_message = (
-                    "You are a professional LinkedIn content writer who understands tone, structure, and engagement psychology. "
-                    "Create a single LinkedIn post that aligns with the user's provided details."
-                )
-
-                prompt_body = f"\n\nSCHEDULED DATE: {scheduled_date.strftime('%A, %B %d, %Y')}\n"
-                prompt_body += f"Topic / Context: {topic_context}\n"
-                prompt_body += f"Purpose / Goal: {purpose_goal}\n"
-                prompt_body += f"Target Audience: {target_audience}\n"
-                prompt_body += f"Tone of Voice: {tone_of_voice}\n"
-                prompt_body += f"Formatting Preference: {formatting or 'Short and story format'}\n"
-                if cta:
-                    prompt_body += f"Optional Call-to-Action (CTA): {cta}\n"
-                if keywords:
-                    prompt_body += f"Keywords to Emphasize: {keywords}\n"
-                if hashtags_instruction:
-                    prompt_body += f"Hashtags (use these): {hashtags_instruction}\n"
-                else:
-                    prompt_body += "Hashtags: Please generate 4–6 relevant hashtags automatically at the end.\n"
-                if user_prompt:
-                    prompt_body += f"Additional Instructions: {user_prompt}\n"
-
-                prompt_body += (
-                    "\nRequirements:\n"
-                    "- Keep the post under 3000 characters.\n"
-                    "- Use an engaging hook, concise body (1–3 short paragraphs), and a CTA if relevant.\n"
-                    "- Maintain natural LinkedIn tone and readability.\n"
-                    "- Return final content as plain text only (no formatting tags or markdown).\n"
-                )
-
-                print(f"[DEBUG] Generating content for {scheduled_date.strftime('%Y-%m-%d')}...")
-
-                max_output_tokens = (
-                    800 if content_length.lower() == "short"
-                    else 2000 if content_length.lower() == "medium"
-                    else 3000
+            generation_fields = {
+                "topic_context": topic_context,
+                "purpose_goal": purpose_goal,
+                "target_audience": target_audience,
+                "tone_of_voice": tone_of_voice,
+                "formatting": formatting,
+                "cta": cta,
+                "keywords": keywords,
+                "hashtags": hashtags,
+                "user_prompt": user_prompt
+            }
+            max_output_tokens = max_output_tokens_for(content_length)
+
+            if request.form.get('stream') == '1':
+                # Render the cards straight away; the page pulls each day's post
+                # from /generate_stream as it is written.
+                placeholders = [day_post(d, "", "") for d in schedule_items]
+                session['draft_id'] = save_draft(placeholders, pending_generation={
+                    "fields": generation_fields,
+                    "max_output_tokens": max_output_tokens,
+                    "use_cache": use_cache,
+                    "dates": [d.strftime("%Y-%m-%d") for d in schedule_items]
+                })
+                return render_template(
+                    'daywise_preview.html',
+                    daywise_content=placeholders,
+                    stream_url=url_for('generate_stream')
                 )
 
-                try:
-                    response = client.models.generate_content(
-                        model='gemini-2.0-flash-exp',
-                        contents=f"{system_message}{prompt_body}",
-                        config=types.GenerateContentConfig(
-                            max_output_tokens=max_output_tokens,
-                            temperature=0.7
-                        )
-                    )
+            daywise_content = generate_schedule(schedule_items, generation_fields, max_output_tokens, use_cache)
 
-                    if response and response.text:
-                        text_output = response.text.strip()
-
-                        for bad_phrase in [
-                            "Here's a possible LinkedIn post, ready to copy and paste:",
-                            "HASHTAGS:",
-                            "Hashtags:",
-                            "**HASHTAGS:**"
-                        ]:
-                            text_output = text_output.replace(bad_phrase, "")
-                        text_output = text_output.strip()
-
-                        html_output = markdown.markdown(text_output, extensions=['extra', 'smarty'])
-                        print(f"[DEBUG] Generated for {scheduled_date.strftime('%Y-%m-%d')} ({len(text_output)} chars)")
-
-                        daywise_content.append({
-                            "date": scheduled_date.strftime("%Y-%m-%d"),
-                            "text": text_output,
-                            "html": html_output
-                        })
-                    else:
-                        print(f"[WARN] Empty response for {scheduled_date.strftime('%Y-%m-%d')}")
-                        daywise_content.append({
-                            "date": scheduled_date.strftime("%Y-%m-%d"),
-                            "text": "(No content generated)",
-                            "html": "(No content generated)"
-                        })
-
-                except Exception as gen_err:
-                    safe_error = str(gen_err).encode("utf-8", "ignore").decode("utf-8", "ignore")
-                    print(f"[ERROR] Generation failed for {scheduled_date.strftime('%Y-%m-%d')}: {safe_error}")
-                    daywise_content.append({
-                        "date": scheduled_date.strftime("%Y-%m-%d"),
-                        "text": "(Error generating this day's content)",
-                        "html": "(Error generating this day's content)"
-                    })
-
-            session['daywise_content'] = daywise_content
+            session['draft_id'] = save_draft(daywise_content)
             flash("Content generated successfully! Review your posts below.", "success")
             return render_template('daywise_preview.html', daywise_content=daywise_content)
 
@@ -742,28 +1697,129 @@ def generate_text():
             flash("Error generating content. Please try again later.", "danger")
             return render_template('text_generation.html')
 
-    if 'daywise_content' in session:
-        return render_template('daywise_preview.html', daywise_content=session['daywise_content'])
+    # Sessions from before the draft store carried the whole list in the cookie.
+    session.pop('daywise_content', None)
+
+    if 'draft_id' in session:
+        daywise_content = load_draft(session['draft_id'])
+        if daywise_content:
+            return render_template('daywise_preview.html', daywise_content=daywise_content)
+        session.pop('draft_id')
 
     return render_template('text_generation.html')
 
+@app.route('/generate_stream')
+@login_required
+def generate_stream():
+    """Server-sent events: pushes each day's post to the preview page as it is generated"""
+    # Sessions from before pending parameters moved to the draft row.
+    session.pop('pending_generation', None)
+
+    draft_id = session.get('draft_id')
+    pending = take_pending_generation(draft_id) if draft_id else None
+    # stream_with_context keeps this context alive for the whole generation;
+    # don't hold a pooled connection through it.
+    mysql.release()
+
+    if not pending or not client:
+        # Nothing to do (e.g. an EventSource reconnect after completion).
+        return Response(sse_event("done", {"count": 0}), mimetype='text/event-stream')
+
+    schedule_items = [datetime.strptime(d, "%Y-%m-%d") for d in pending["dates"]]
+    fields = pending["fields"]
+    max_output_tokens = pending["max_output_tokens"]
+    use_cache = pending.get("use_cache", True)
+
+    def events():
+        messages = queue.Queue()
+        emit = lambda event, data: messages.put(sse_event(event, data))
+
+        pool = ThreadPoolExecutor(
+            max_workers=min(app.config['GEMINI_MAX_WORKERS'], len(schedule_items)),
+            thread_name_prefix="gemini-stream"
+        )
+        # Batch chunks when batching applies (fewer calls and prompt tokens),
+        # otherwise one streamed call per day. Either way each future returns a
+        # list of posts, so the draft is rebuilt the same way.
+        chunks = batch_chunks(schedule_items, max_output_tokens) or [[d] for d in schedule_items]
+        futures = []
+        first_index = 1
+        for chunk in chunks:
+            if len(chunk) > 1:
+                futures.append(pool.submit(stream_batch_chunk, first_index, chunk, fields,
+                                           max_output_tokens, emit, use_cache))
+            else:
+                futures.append(pool.submit(
+                    lambda index, d: [stream_day_post(index, d, build_day_prompt(d, fields),
+                                                      max_output_tokens, emit, use_cache)],
+                    first_index, chunk[0]
+                ))
+            first_index += len(chunk)
+
+        try:
+            remaining = len(schedule_items)
+            while remaining:
+                message = messages.get()
+                if message.startswith("event: day"):
+                    remaining -= 1
+                yield message
+
+            # The cookie has already gone out, so results are kept server-side.
+            if draft_id:
+                try:
+                    save_draft([post for future in futures for post in future.result()], draft_id)
+                finally:
+                    mysql.release()
+
+            yield sse_event("done", {"count": len(schedule_items)})
+        finally:
+            # Client went away or we finished: don't leave queued days running.
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.route('/clear_and_generate')
 @login_required
 def clear_and_generate():
     """Clear previous generation and start fresh"""
-    if 'daywise_content' in session:
-        session.pop('daywise_content')
+    if 'draft_id' in session:
+        delete_draft(session.pop('draft_id'))
     return redirect(url_for('generate_text'))
 
 # ================================
 # SCHEDULED POSTS MANAGEMENT
 # ================================
+def parse_publish_time(date_str, time_str=None):
+    """Builds a minute-precision publish datetime from form values.
+
+    Accepts 'YYYY-MM-DD' plus an optional 'HH:MM', or a combined
+    'YYYY-MM-DDTHH:MM' / 'YYYY-MM-DD HH:MM[:SS]'. Date-only values fall back to
+    DEFAULT_PUBLISH_TIME. Returns None when the value cannot be parsed.
+    """
+    if not date_str:
+        return None
+
+    value = date_str.strip().replace('T', ' ')
+    if ' ' not in value:
+        value = f"{value} {(time_str or '').strip() or app.config['DEFAULT_PUBLISH_TIME']}"
+
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(value, fmt).replace(second=0)
+        except ValueError:
+            continue
+    return None
+
 @app.route('/add_post', methods=['GET', 'POST'])
 @login_required
 def add_post():
     """Manually add a scheduled post"""
     if request.method == 'POST':
-        post_date = request.form.get('post_date')
+        post_date = parse_publish_time(request.form.get('post_date'), request.form.get('post_time'))
         content = request.form.get('content')
         added_by = session.get('linkedin_user', 'Unknown User')
 
@@ -777,8 +1833,10 @@ def add_post():
                 INSERT INTO scheduled_posts (post_date, content, added_by, author_urn, added_date)
                 VALUES (%s, %s, %s, %s, NOW())
             """, (post_date, content, added_by, session.get('linkedin_user_urn')))
+            bump_post_counters(cur, session.get('linkedin_user_urn'), added=1)
             mysql.connection.commit()
             cur.close()
+            notify_schedule_changed(post_date)
             flash("✅ Post added successfully!", "success")
             return redirect(url_for('view_posts'))
         except Exception as e:
@@ -792,15 +1850,70 @@ def add_post():
 # ROUTE: Save generated day-wise schedule to DB
 # -------------------------------
 from datetime import datetime
-from werkzeug.utils import secure_filename
 
 # Ensure upload folder exists
 UPLOAD_FOLDER = os.path.join(app.root_path, 'static', 'uploaded_post_img')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Lazily generated thumbnails of uploaded images, one folder per size
+THUMBNAIL_FOLDER = os.path.join(app.root_path, 'static', 'thumbnails')
+
+def write_file_atomic(path, data):
+    # Write-then-rename so a concurrent request never reads a partial file.
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as out:
+        out.write(data)
+    os.replace(tmp_path, path)
+
+
+def store_image_file(cursor, stream):
+    """Stores an image under its content hash; returns ``(content_hash, filename, size_bytes)``.
+
+    The hash is computed while the stream is read, so a picture that is already
+    stored is neither re-encoded nor written again.
+    """
+    raw, content_hash = read_and_hash(stream)
+
+    cursor.execute("SELECT filename FROM image_blobs WHERE content_hash = %s", (content_hash,))
+    row = cursor.fetchone()
+
+    if row and os.path.exists(os.path.join(UPLOAD_FOLDER, row["filename"])):
+        image_filename = row["filename"]
+        print(f"[DEBUG] Reusing stored image {image_filename}")
+    else:
+        # Resize, strip metadata and re-encode before it ever hits disk;
+        # the extension reflects the format actually written.
+        image_bytes, ext, _mime = optimize_image(
+            io.BytesIO(raw), max_dimension=app.config['IMAGE_MAX_DIMENSION']
+        )
+        image_filename = f"{content_hash}{ext}"
+        write_file_atomic(os.path.join(UPLOAD_FOLDER, image_filename), image_bytes)
+        print(f"[DEBUG] Image saved as {image_filename}")
+
+    return content_hash, image_filename, os.path.getsize(os.path.join(UPLOAD_FOLDER, image_filename))
+
+
+def add_image_refs(cursor, blobs):
+    """Takes one reference per ``(content_hash, filename, size_bytes)`` entry; the caller commits."""
+    if blobs:
+        cursor.executemany("""
+            INSERT INTO image_blobs (content_hash, filename, size_bytes, refcount, created_at)
+            VALUES (%s, %s, %s, 1, NOW())
+            ON DUPLICATE KEY UPDATE filename = VALUES(filename), refcount = refcount + 1
+        """, blobs)
+
+
+def store_post_image(cursor, stream):
+    """Stores an image and takes a reference to it; returns the filename. The caller commits."""
+    blob = store_image_file(cursor, stream)
+    add_image_refs(cursor, [blob])
+    return blob[1]
+
+
 @app.route('/save_schedule', methods=['POST'])
 @login_required
 def save_schedule():
+    """Saves a generated schedule in one transaction: every post or none."""
     print("\n=== [DEBUG] /save_schedule ROUTE CALLED ===")
     print(f"[DEBUG] Session keys: {list(session.keys())}")
 
@@ -819,121 +1932,259 @@ def save_schedule():
     total_posts = int(request.form.get('total_posts', 0))
     added_by = "AI Generator"
 
-    saved_count = 0
     cursor = mysql.connection.cursor()
+    saved_dates = []
+    post_images = []
+    blobs = []
 
-    for i in range(1, total_posts + 1):
-        post_date = request.form.get(f'post_date_{i}')
-        post_content = request.form.get(f'post_content_{i}')
-        image_file = request.files.get(f'image_{i}')  # Get uploaded image
+    try:
+        now = datetime.now()
 
-        if post_date and post_content:
-            try:
-                now = datetime.now()
-                image_filename = None
+        for i in range(1, total_posts + 1):
+            post_date = parse_publish_time(request.form.get(f'post_date_{i}'), request.form.get(f'post_time_{i}'))
+            post_content = request.form.get(f'post_content_{i}')
 
-                # Insert post first (so we can get its auto-increment ID)
-                cursor.execute("""
-                    INSERT INTO scheduled_posts 
-                    (post_date, content, added_by, author_urn, posted, added_date, updated_by, updated_date)
-                    VALUES (%s, %s, %s, %s, %s, %s, NULL, %s)
-                """, (post_date, post_content.strip(), added_by, author_urn, 0, now, now))
-                mysql.connection.commit()
+            if not (post_date and post_content):
+                continue
 
-                post_id = cursor.lastrowid  # get the auto increment ID
+            # Each day's file input is its own field, so images stay with their post.
+            saved_filenames = []
+            for image_file in request.files.getlist(f"images_{i}")[:5]:  # limit to 5
+                if image_file and image_file.filename:
+                    blob = store_image_file(cursor, image_file.stream)
+                    blobs.append(blob)
+                    saved_filenames.append(blob[1])
 
-                image_files = request.files.getlist("images[]")
-                saved_filenames = []
+            # One INSERT per post so each gets a reliable lastrowid for its
+            # image rows; it is still a single transaction and commit.
+            cursor.execute("""
+                INSERT INTO scheduled_posts
+                (post_date, content, added_by, author_urn, posted, added_date, updated_by, updated_date)
+                VALUES (%s, %s, %s, %s, %s, %s, NULL, %s)
+            """, (post_date, post_content.strip(), added_by, author_urn, 0, now, now))
+            post_id = cursor.lastrowid
+            saved_dates.append(post_date)
+            post_images.extend(
+                (post_id, position, filename) for position, filename in enumerate(saved_filenames)
+            )
 
-                if image_files:
-                    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+        if saved_dates:
+            if post_images:
+                cursor.executemany(
+                    "INSERT INTO post_images (post_id, position, filename) VALUES (%s, %s, %s)",
+                    post_images
+                )
+            add_image_refs(cursor, blobs)
+            bump_post_counters(cursor, author_urn, added=len(saved_dates))
+            mysql.connection.commit()
 
-                    for image_file in image_files[:5]:  # limit to 5
-                        if image_file and image_file.filename:
+    except Exception as e:
+        mysql.connection.rollback()
+        cursor.close()
+        safe_error = str(e).encode("utf-8", "ignore").decode("utf-8", "ignore")
+        print(f"[ERROR] Failed to save schedule: {safe_error}")
+        print(traceback.format_exc())
+        flash(f"❌ Error saving schedule, nothing was saved: {safe_error}", "danger")
+        return redirect(url_for('generate_text'))
 
-                            now = datetime.now()
-                            timestamp = now.strftime("%Y%m%d%H%M%S")
-                            random_digits = f"{py_random.randint(100, 999)}"
+    cursor.close()
 
-                            original_filename = secure_filename(image_file.filename)
-                            ext = os.path.splitext(original_filename)[1]
-                            image_filename = f"{timestamp}{random_digits}{post_id}{ext}"
+    for post_date in saved_dates:
+        notify_schedule_changed(post_date)
 
-                            image_path = os.path.join(UPLOAD_FOLDER, image_filename)
-                            image_file.save(image_path)
+    print(f"[DEBUG] Saved {len(saved_dates)} post(s) with {len(blobs)} image(s) for author_urn={author_urn}")
+    flash(f"✅ {len(saved_dates)} post(s) saved successfully!", "success")
+    return redirect(url_for('view_posts'))
 
-                            saved_filenames.append(image_filename)
+def immutable_file_response(directory, filename, mimetype):
+    """Serves a content-named file with an ETag and a long-lived immutable Cache-Control."""
+    response = send_from_directory(
+        directory, filename, mimetype=mimetype,
+        max_age=app.config['IMAGE_CACHE_MAX_AGE'], conditional=True, etag=True
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
-                            print(f"[DEBUG] Image saved as {image_filename}")
+# -------------------------------
+# ROUTE: Cached thumbnails of uploaded post images
+# -------------------------------
+@app.route('/thumbnails/<size>/<filename>')
+def post_image_thumbnail(size, filename):
+    if size not in THUMBNAIL_SIZES or filename != os.path.basename(filename):
+        abort(404)
+
+    thumb_dir = os.path.join(THUMBNAIL_FOLDER, size)
+    thumb_name = f"{filename}.jpg"
+    thumb_path = os.path.join(thumb_dir, thumb_name)
+
+    if not os.path.exists(thumb_path):
+        source_path = os.path.join(UPLOAD_FOLDER, filename)
+        if not os.path.exists(source_path):
+            abort(404)
+        try:
+            data = make_thumbnail(source_path, THUMBNAIL_SIZES[size])
+        except Exception as e:
+            print(f"[ERROR] Thumbnail for {filename} failed: {e}")
+            abort(404)
 
-                    # Store multiple filenames as CSV
-                    csv_filenames = ",".join(saved_filenames)
+        os.makedirs(thumb_dir, exist_ok=True)
+        write_file_atomic(thumb_path, data)
+        print(f"[DEBUG] Thumbnail generated: {size}/{thumb_name}")
 
-                    cursor.execute("""
-                        UPDATE scheduled_posts
-                        SET image = %s, updated_date = NOW()
-                        WHERE id = %s
-                    """, (csv_filenames, post_id))
+    return immutable_file_response(thumb_dir, thumb_name, "image/jpeg")
 
-                    mysql.connection.commit()
+# -------------------------------
+# ROUTE: View all scheduled posts
+# -------------------------------
+PAGE_CURSOR_FORMAT = "%Y-%m-%dT%H:%M:%S"
 
 
-                    print(f"[DEBUG] Image saved as {image_filename} in {UPLOAD_FOLDER}")
+def page_cursor(post):
+    """Opaque keyset cursor for a post's position in (post_date, id) order."""
+    return f"{post['post_date'].strftime(PAGE_CURSOR_FORMAT)}_{post['id']}"
 
 
-                saved_count += 1
-                print(f"[DEBUG] Saved post ID={post_id} with author_urn={author_urn}")
+def parse_page_cursor(value):
+    if not value:
+        return None
+    try:
+        date_part, id_part = value.rsplit("_", 1)
+        return datetime.strptime(date_part, PAGE_CURSOR_FORMAT), int(id_part)
+    except ValueError:
+        return None
 
-            except Exception as e:
-                safe_error = str(e).encode("utf-8", "ignore").decode("utf-8", "ignore")
-                print(f"[ERROR] Failed to save post: {safe_error}")
-                flash(f"❌ Error saving post: {safe_error}", "danger")
-                continue
 
-    cursor.close()
-    flash(f"✅ {saved_count} post(s) saved successfully!", "success")
-    return redirect(url_for('view_posts'))
+def parse_filter_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d") if value else None
+    except ValueError:
+        return None
+
 
-# -------------------------------
-# ROUTE: View all scheduled posts
-# -------------------------------
 @app.route("/view_posts")
 @login_required
 def view_posts():
     auth_urn = session.get('linkedin_user_urn')
     user_pic = session.get('user_pic') 
 
+    status = request.args.get('status', 'all')
+    date_from = parse_filter_date(request.args.get('from'))
+    date_to = parse_filter_date(request.args.get('to'))
+    after = parse_page_cursor(request.args.get('after'))
+    before = None if after else parse_page_cursor(request.args.get('before'))
+    page_size = app.config['VIEW_POSTS_PAGE_SIZE']
+
+    # Filters and paging run in SQL, walking (author_urn, post_date, id) in order.
+    where = ["author_urn = %s"]
+    params = [auth_urn]
+    if status in ('pending', 'posted'):
+        where.append("posted = %s")
+        params.append(1 if status == 'posted' else 0)
+    elif status == 'attention':
+        # Posts the dispatcher gave up on, or could not confirm, until someone retries them.
+        where.append("posted = 0 AND id IN (SELECT post_id FROM publish_jobs WHERE status IN (%s, %s))")
+        params.extend([outbox.FAILED, outbox.IN_DOUBT])
+    if date_from:
+        where.append("post_date >= %s")
+        params.append(date_from)
+    if date_to:
+        where.append("post_date < %s")
+        params.append(date_to + timedelta(days=1))
+
+    keyset = after or before
+    if keyset:
+        op = ">" if after else "<"
+        where.append(f"(post_date {op} %s OR (post_date = %s AND id {op} %s))")
+        params.extend([keyset[0], keyset[0], keyset[1]])
+    direction = "DESC" if before else "ASC"
+
     cur = mysql.connection.cursor()
-    cur.execute("SELECT * FROM scheduled_posts WHERE author_urn = %s", (auth_urn,))
-    posts = cur.fetchall()
+    cur.execute(f"""
+        SELECT id, post_date, content, posted FROM scheduled_posts
+        WHERE {" AND ".join(where)}
+        ORDER BY post_date {direction}, id {direction}
+        LIMIT %s
+    """, (*params, page_size + 1))
+    posts = list(cur.fetchall())
+
+    # One extra row tells whether another page exists in the walk direction.
+    has_more = len(posts) > page_size
+    posts = posts[:page_size]
+    if before:
+        posts.reverse()
+
+    attach_post_images(cur, posts)
+    jobs = outbox.job_states(cur, [post["id"] for post in posts])
     cur.close()
 
     all_posts = []
     for post in posts:
-        post_date = post.get("scheduled_time") or post.get("post_date")
-        post["display_date"] = post_date
+        post["display_date"] = post["post_date"]
+        job = jobs.get(post["id"])
+        post["publish_status"] = job["status"] if job and not post["posted"] else None
+        post["publish_error"] = (job or {}).get("last_error")
+
+        # The list and preview use thumbnails and only link to the originals.
+        image_names = post_image_list(post)
+        post["thumb_urls"] = [
+            url_for('post_image_thumbnail', size="sm", filename=img_name)
+            for img_name in image_names
+        ]
+        post["image_urls"] = [
+            url_for('post_image_thumbnail', size="md", filename=img_name)
+            for img_name in image_names
+        ]
+        post["original_urls"] = [
+            url_for('static', filename=f"uploaded_post_img/{img_name}")
+            for img_name in image_names
+        ]
+        all_posts.append(post)
 
-        # Handle multiple images
-        image_data = post.get("image")  # Could be "img1.jpg" or "img1.jpg,img2.jpg,img3.jpg"
-        
-        if image_data:
-            # Split by comma if multiple images are stored together
-            image_names = [img.strip() for img in image_data.split(',') if img.strip()]
-            
-            # Build URLs for all images
-            post["image_urls"] = [
-                url_for('static', filename=f"upload_post_img/{img_name}")
-                for img_name in image_names
-            ]
-            print(f"[DEBUG] Post ID={post['id']} has {post['image_urls']} images")
-        else:
-            post["image_urls"] = []
+    filters = {
+        "status": status,
+        "from": request.args.get('from', ''),
+        "to": request.args.get('to', ''),
+    }
+    next_cursor = prev_cursor = None
+    if all_posts:
+        if has_more or before:
+            next_cursor = page_cursor(all_posts[-1])
+        if (has_more and before) or after:
+            prev_cursor = page_cursor(all_posts[0])
+
+    return render_template(
+        "view_posts.html",
+        all_posts=all_posts,
+        user_pic=user_pic,
+        filters=filters,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor
+    )
 
-        print(f"{image_data} all images")
+@app.route('/retry_publish/<int:post_id>', methods=['POST'])
+@login_required
+def retry_publish(post_id):
+    """Puts a failed or in-doubt publish job back in the queue."""
+    cur = mysql.connection.cursor()
+    cur.execute(
+        "SELECT id FROM scheduled_posts WHERE id = %s AND author_urn = %s AND posted = 0",
+        (post_id, session.get('linkedin_user_urn'))
+    )
+    if not cur.fetchone():
+        cur.close()
+        flash("⚠️ Post not found.", "warning")
+        return redirect(url_for('view_posts'))
 
-        all_posts.append(post)
+    reset = outbox.reset_job(cur, post_id)
+    mysql.connection.commit()
+    cur.close()
 
-    return render_template("view_posts.html", all_posts=all_posts, user_pic=user_pic)
+    if reset:
+        flash("🔁 Post queued to publish again.", "success")
+    else:
+        flash("ℹ️ This post is already being published.", "info")
+    return redirect(request.referrer or url_for('view_posts'))
 
 # -------------------------------
 # ROUTE: Update existing post
@@ -943,18 +2194,25 @@ def update_post(post_id):
     cur = mysql.connection.cursor()
 
     if request.method == 'POST':
-        post_date = request.form.get('post_date')
+        post_date = parse_publish_time(request.form.get('post_date'), request.form.get('post_time'))
         content = request.form.get('content')
         updated_by = request.form.get('updated_by', 'Admin')
 
+        if not post_date:
+            flash("⚠️ Please enter a valid publish date and time.", "warning")
+            return redirect(url_for('update_post', post_id=post_id))
+
         try:
             cur.execute("""
                 UPDATE scheduled_posts
                 SET post_date=%s, content=%s, updated_by=%s, updated_date=NOW()
                 WHERE id=%s
             """, (post_date, content, updated_by, post_id))
+            # A parked or retrying publish job follows the edit instead of the old schedule.
+            outbox.reset_job(cur, post_id)
             mysql.connection.commit()
             cur.close()
+            notify_schedule_changed(post_date)
             flash("✅ Post updated successfully!", "success")
             return redirect(url_for('view_posts'))
         except Exception as e:
@@ -1011,23 +2269,17 @@ def post_to_linkedin():
     try:
         # Step 1: Get user profile using OpenID Connect
         print("\n[STEP 1] Fetching LinkedIn User Profile...")
-        profile_url = "https://api.linkedin.com/v2/userinfo"
-        headers = {"Authorization": f"Bearer {access_token}"}
-        
-        print(f"[DEBUG] GET {profile_url}")
-        profile_response = requests.get(profile_url, headers=headers, timeout=10)
         
-        print(f"[DEBUG] Profile response status: {profile_response.status_code}")
-        print(f"[DEBUG] Profile response body: {profile_response.text}")
-        
-        if profile_response.status_code != 200:
-            print(f"[ERROR] Failed to fetch LinkedIn profile")
+        try:
+            profile_data = linkedin.userinfo(access_token)
+        except LinkedInAPIError as e:
+            print(f"[ERROR] Failed to fetch LinkedIn profile: {e.status_code} - {e.body}")
             
-            if profile_response.status_code == 401:
+            if e.status_code == 401:
                 print("[ERROR] Token expired - clearing session")
                 session.pop('linkedin_token', None)
                 flash("❌ LinkedIn session expired. Please reconnect.", "danger")
-            elif profile_response.status_code == 403:
+            elif e.status_code == 403:
                 print("[ERROR] Permission denied")
                 flash("❌ Permission denied. Please reconnect to LinkedIn with proper permissions.", "danger")
                 session.pop('linkedin_token', None)
@@ -1036,7 +2288,6 @@ def post_to_linkedin():
             
             return redirect(url_for('generate_text'))
         
-        profile_data = profile_response.json()
         print(f"[DEBUG] Profile data keys: {list(profile_data.keys())}")
         print(f"[DEBUG] Full profile: {profile_data}")
         
@@ -1049,13 +2300,6 @@ def post_to_linkedin():
             return redirect(url_for('generate_text'))
         
         # Step 2: Post using UGC Posts API (v2) - Most stable
-        post_url = "https://api.linkedin.com/v2/ugcPosts"
-        headers_post = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json",
-            "X-Restli-Protocol-Version": "2.0.0"
-        }
-        
         post_data = {
             "author": f"urn:li:person:{user_sub}",
             "lifecycleState": "PUBLISHED",
@@ -1072,52 +2316,27 @@ def post_to_linkedin():
             }
         }
         
-        print(f"[DEBUG] POST {post_url}")
-        import json
-        print(f"[DEBUG] Headers: {headers_post}")
-        print(f"[DEBUG] Payload:")
-        
-        post_response = requests.post(
-            post_url,
-            headers=headers_post,
-            json=post_data,
-            timeout=10
-        )
-        
-        print(f"[DEBUG] Post response status: {post_response.status_code}")
-        print(f"[DEBUG] Post response headers: {dict(post_response.headers)}")
-        print(f"[DEBUG] Post response body: {post_response.text}")
-        
         # Step 3: Handle response
-        if post_response.status_code in [200, 201]:
+        try:
+            post_urn = linkedin.create_ugc_post(access_token, post_data)
             print("[SUCCESS] Post created successfully on LinkedIn!")
-            try:
-                response_data = post_response.json()
-                post_id = response_data.get('id', 'unknown')
-                print(f"[DEBUG] Post ID: {post_id}")
-            except:
-                print("[DEBUG] Could not parse response JSON")
+            print(f"[DEBUG] Post ID: {post_urn or 'unknown'}")
             
             flash("✅ Successfully posted to LinkedIn!", "success")
-        else:
+        except LinkedInAPIError as e:
             print(f"[ERROR] Failed to create LinkedIn post")
+            print(f"[ERROR] Error data: {e.body}")
+            error_message = e.message
             
-            try:
-                error_data = post_response.json()
-                print(f"[ERROR] Error data: {error_data}")
-                error_message = error_data.get('message', post_response.text)
-            except:
-                error_message = post_response.text
-            
-            if post_response.status_code == 401:
+            if e.status_code == 401:
                 print("[ERROR] Authentication failed")
                 session.pop('linkedin_token', None)
                 flash("❌ LinkedIn session expired. Please reconnect.", "danger")
-            elif post_response.status_code == 403:
+            elif e.status_code == 403:
                 print("[ERROR] Permission denied - missing w_member_social scope")
                 flash("❌ Your LinkedIn app needs 'w_member_social' permission. Please reconnect.", "danger")
                 session.pop('linkedin_token', None)
-            elif post_response.status_code == 422:
+            elif e.status_code == 422:
                 print("[ERROR] Invalid request data")
                 flash(f"❌ Invalid post data: {error_message}", "danger")
             else:
@@ -1162,17 +2381,121 @@ def generate_image():
         # parse response parts to find image part
         for part in response.candidates[0].content.parts:
             if part.inline_data:  # this is image data
-                img = Image.open(io.BytesIO(part.inline_data.data))
-                buf = io.BytesIO()
-                img.save(buf, format="PNG")
-                encoded = base64.b64encode(buf.getvalue()).decode('utf-8')
-                return render_template('image_generation.html', image_data=encoded, prompt=prompt)
+                image_name = save_generated_image(part.inline_data.data, part.inline_data.mime_type)
+                return render_template(
+                    'image_generation.html',
+                    image_url=url_for('generated_image_file', filename=image_name),
+                    image_name=image_name,
+                    prompt=prompt,
+                    pending_posts=pending_posts_for_attach()
+                )
 
         # if no image found
         return render_template('image_generation.html', error="⚠️ Couldn't generate image.")
 
     except Exception as e:
         return render_template('image_generation.html', error=f"⚠️ Error: {str(e)}")
+
+
+def save_generated_image(data, mime_type):
+    """Writes a generated image to IMAGE_FOLDER under its content hash; returns the filename.
+
+    PNG and JPEG bytes are stored as-is; anything else is re-encoded to PNG.
+    """
+    ext = GENERATED_IMAGE_TYPES.get(mime_type)
+    if ext is None:
+        buf = io.BytesIO()
+        Image.open(io.BytesIO(data)).save(buf, format="PNG")
+        data, ext = buf.getvalue(), ".png"
+
+    image_name = f"{hashlib.sha256(data).hexdigest()}{ext}"
+    image_path = os.path.join(IMAGE_FOLDER, image_name)
+    if not os.path.exists(image_path):
+        write_file_atomic(image_path, data)
+        print(f"[DEBUG] Generated image saved as {image_name}")
+    return image_name
+
+
+def pending_posts_for_attach():
+    """The signed-in author's unpublished posts, for the attach-image picker."""
+    author_urn = session.get('linkedin_user_urn')
+    if not author_urn:
+        return []
+
+    cur = mysql.connection.cursor()
+    cur.execute("""
+        SELECT id, post_date, LEFT(content, 80) AS preview FROM scheduled_posts
+        WHERE author_urn = %s AND posted = 0
+        ORDER BY post_date
+        LIMIT 50
+    """, (author_urn,))
+    posts = cur.fetchall()
+    cur.close()
+    return posts
+
+
+@app.route('/generated_image/<filename>')
+def generated_image_file(filename):
+    if filename != os.path.basename(filename) or not image_content_hash(filename):
+        abort(404)
+    return immutable_file_response(IMAGE_FOLDER, filename, mime_type_for(filename))
+
+
+@app.route('/attach_generated_image', methods=['POST'])
+@login_required
+def attach_generated_image():
+    """Attaches a generated image to one of the author's pending scheduled posts."""
+    image_name = request.form.get('image_name', '')
+    post_id = request.form.get('post_id', type=int)
+    image_path = os.path.join(IMAGE_FOLDER, image_name)
+
+    if image_name != os.path.basename(image_name) or not image_content_hash(image_name) \
+            or not os.path.exists(image_path) or not post_id:
+        flash("⚠️ Pick a generated image and a post to attach it to.", "warning")
+        return redirect(url_for('view_posts'))
+
+    cur = mysql.connection.cursor()
+    try:
+        cur.execute("""
+            SELECT id FROM scheduled_posts
+            WHERE id = %s AND author_urn = %s AND posted = 0
+            FOR UPDATE
+        """, (post_id, session.get('linkedin_user_urn')))
+        post = cur.fetchone()
+        if not post:
+            mysql.connection.rollback()
+            flash("⚠️ Post not found or already published.", "warning")
+            return redirect(url_for('view_posts'))
+
+        image_list = attach_post_images(cur, [post])[0]["images"]
+        if len(image_list) >= 5:
+            mysql.connection.rollback()
+            flash("⚠️ A post can have at most 5 images.", "warning")
+            return redirect(url_for('view_posts'))
+
+        with open(image_path, "rb") as image_file:
+            filename = store_post_image(cur, image_file)
+
+        cur.execute("""
+            INSERT INTO post_images (post_id, position, filename) VALUES (%s, %s, %s)
+        """, (post_id, len(image_list), filename))
+        # The image list changed, so the post has to be staged again.
+        cur.execute("""
+            UPDATE scheduled_posts
+            SET assets_staged_at = NULL, updated_date = NOW()
+            WHERE id = %s
+        """, (post_id,))
+        mysql.connection.commit()
+        flash("✅ Image attached to your scheduled post.", "success")
+    except Exception as e:
+        mysql.connection.rollback()
+        print(f"[ERROR] Failed to attach generated image: {e}")
+        print(traceback.format_exc())
+        flash(f"❌ Could not attach image: {str(e)}", "danger")
+    finally:
+        cur.close()
+
+    return redirect(url_for('view_posts'))
     
 @app.route('/profile')
 @login_required
@@ -1193,32 +2516,29 @@ def profile():
     # Get additional stats from database
     cur = mysql.connection.cursor()
     
-    # Get total posts count
+    # Post counts come from the author's counters row, kept current by every
+    # write that adds or publishes a post.
     cur.execute("""
-        SELECT COUNT(*) as total_posts 
-        FROM scheduled_posts 
+        SELECT total_posts, scheduled_posts, published_posts
+        FROM post_counters
         WHERE author_urn = %s
     """, (profile_data['linkedin_user_urn'],))
     post_stats = cur.fetchone()
-    profile_data['total_posts'] = post_stats['total_posts'] if post_stats else 0
-    
-    # Get scheduled posts count
-    cur.execute("""
-        SELECT COUNT(*) as scheduled_posts 
-        FROM scheduled_posts 
-        WHERE author_urn = %s AND posted = '0'
-    """, (profile_data['linkedin_user_urn'],))
-    scheduled_stats = cur.fetchone()
-    profile_data['scheduled_posts'] = scheduled_stats['scheduled_posts'] if scheduled_stats else 0
-    
-    # Get published posts count
-    cur.execute("""
-        SELECT COUNT(*) as published_posts 
-        FROM scheduled_posts 
-        WHERE author_urn = %s AND posted = '1'
-    """, (profile_data['linkedin_user_urn'],))
-    published_stats = cur.fetchone()
-    profile_data['published_posts'] = published_stats['published_posts'] if published_stats else 0
+
+    if not post_stats:
+        # No counters row yet: aggregate once over the author's posts.
+        cur.execute("""
+            SELECT COUNT(*) AS total_posts,
+                   COALESCE(SUM(CASE WHEN posted = 0 THEN 1 ELSE 0 END), 0) AS scheduled_posts,
+                   COALESCE(SUM(CASE WHEN posted = 1 THEN 1 ELSE 0 END), 0) AS published_posts
+            FROM scheduled_posts
+            WHERE author_urn = %s
+        """, (profile_data['linkedin_user_urn'],))
+        post_stats = cur.fetchone()
+
+    profile_data['total_posts'] = int(post_stats['total_posts'])
+    profile_data['scheduled_posts'] = int(post_stats['scheduled_posts'])
+    profile_data['published_posts'] = int(post_stats['published_posts'])
     
     # Get account creation date
     cur.execute("""
@@ -1285,6 +2605,7 @@ def update_profile():
     
     mysql.connection.commit()
     cur.close()
+    verified_users.pop(session['user_id'])
     
     # Update session
     session['linkedin_user'] = user_name
@@ -1292,5 +2613,81 @@ def update_profile():
     
     return redirect(url_for('profile'))
 
+@app.route('/db_pool_stats')
+@login_required
+def db_pool_stats():
+    """Connection pool usage and wait metrics."""
+    return jsonify(mysql.stats())
+
+# ================================
+# DATABASE MIGRATIONS
+# ================================
+@app.cli.command('db-upgrade')
+def db_upgrade():
+    """Apply pending schema migrations."""
+    applied = migrations.upgrade(mysql.connection)
+    print(f"Applied migrations: {applied}" if applied else "Database schema is up to date.")
+
+# ================================
+# STANDALONE DISPATCH WORKER
+# ================================
+@app.cli.command('dispatch-worker')
+@click.option('--shard', default=0, show_default=True, help="This worker's shard index (0-based).")
+@click.option('--shards', default=1, show_default=True, help="Total number of dispatch workers.")
+@click.option('--interval', default=None, type=float,
+              help="Seconds between polls [default: DISPATCH_WORKER_POLL_SECONDS].")
+@click.option('--once', is_flag=True, help="Run a single dispatch pass and exit.")
+def dispatch_worker(shard, shards, interval, once):
+    """Run the scheduled-post dispatcher as its own process.
+
+    Workers split authors by CRC32(author_urn) % shards. SIGTERM or Ctrl-C
+    lets the current batch finish and record its outcomes before exiting;
+    a second signal exits immediately. Run the web tier with
+    SCHEDULER_ENABLED=0 when using workers.
+    """
+    if shards < 1 or not 0 <= shard < shards:
+        raise click.BadParameter("need 0 <= --shard < --shards")
+
+    shard_spec = (shard, shards)
+    interval = interval or app.config['DISPATCH_WORKER_POLL_SECONDS']
+    stage_every = app.config['ASSET_STAGE_INTERVAL_MINUTES'] * 60
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"[WORKER] Signal {signum} received; finishing in-flight posts before exit.")
+        stop.set()
+        # A second signal falls through to the default handler and exits at once.
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    print(f"[WORKER] Dispatch worker shard {shard}/{shards} started (poll every {interval}s).")
+    last_staged = 0.0
+
+    while not stop.is_set():
+        with app.app_context():
+            try:
+                if time.monotonic() - last_staged >= stage_every:
+                    stage_upcoming_assets(shard=shard_spec)
+                    last_staged = time.monotonic()
+
+                summary = dispatch_all_due_posts(shard=shard_spec, stop=stop)
+                if summary["total_posts"]:
+                    print(f"[WORKER] {summary['successful']} published, {summary['failed']} failed, "
+                          f"{summary['in_doubt']} in doubt in {summary['elapsed_ms']} ms")
+            except Exception as e:
+                print(f"[WORKER ERROR] {e}")
+                print(traceback.format_exc())
+
+        if once:
+            break
+        stop.wait(interval)
+
+    image_upload_pool.shutdown(wait=True)
+    linkedin.close()
+    print(f"[WORKER] Dispatch worker shard {shard}/{shards} stopped.")
+
 if __name__ == '__main__':
     app.run(debug=True, port=5500)
\ No newline at end of file
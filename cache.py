@@ -0,0 +1,153 @@
+"""
+Small in-process caches.
+
+LRUCache is a thread-safe LRU map with a per-entry TTL. GenerationCache builds
+on it to remember Gemini generations by a hash of everything that determines
+the output (model, prompt and generation config), optionally persisting entries
+to disk so they survive restarts and are shared between worker processes.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe LRU cache whose entries expire ``ttl`` seconds after being set."""
+
+    def __init__(self, maxsize=256, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at=None):
+        with self._lock:
+            self._data[key] = (value, expires_at or time.time() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class GenerationCache(LRUCache):
+    """Content-addressed cache of Gemini generations.
+
+    Keys come from ``key_for``; values must be JSON-serialisable. With a
+    ``directory`` every entry is also written to ``<directory>/<key>.json`` and
+    memory misses fall back to disk; each write prunes the directory back to
+    ``maxsize`` files, expired ones first. ``enabled=False`` turns every lookup
+    into a miss and every store into a no-op.
+    """
+
+    def __init__(self, maxsize=256, ttl=86400, directory=None, enabled=True):
+        super().__init__(maxsize, ttl)
+        self.directory = directory
+        self.enabled = enabled
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key_for(model, contents, config):
+        payload = json.dumps({"model": model, "contents": contents, "config": config}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key, default=None):
+        if not self.enabled:
+            return default
+
+        value = super().get(key)
+        if value is not None or not self.directory:
+            return default if value is None else value
+
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return default
+
+        if entry.get("expires_at", 0) <= time.time():
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            return default
+
+        super().set(key, entry["value"], entry["expires_at"])
+        return entry["value"]
+
+    def set(self, key, value, expires_at=None):
+        if not self.enabled:
+            return
+
+        expires_at = expires_at or time.time() + self.ttl
+        super().set(key, value, expires_at)
+
+        if self.directory:
+            # Write-then-rename so concurrent readers never see a partial file.
+            tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"expires_at": expires_at, "value": value}, f)
+                os.replace(tmp_path, self._path(key))
+            except OSError as e:
+                print(f"[CACHE] Could not persist {key}: {e}")
+            self._prune()
+
+    def _prune(self):
+        """Deletes expired entry files, then the oldest ones beyond ``maxsize``.
+
+        A file's mtime is when it was written, so mtime + ttl approximates its
+        expiry without opening it.
+        """
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(".json"):
+                        try:
+                            entries.append((entry.stat().st_mtime, entry.path))
+                        except OSError:
+                            pass
+        except OSError:
+            return
+
+        now = time.time()
+        entries.sort()
+        excess = len(entries) - self.maxsize
+        for index, (mtime, path) in enumerate(entries):
+            if index >= excess and mtime + self.ttl > now:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # Another process pruned it first.
+                pass
@@ -0,0 +1,222 @@
+"""
+Pooled MySQL connections for the Flask app.
+
+A drop-in for flask_mysqldb.MySQL: ``mysql.connection`` still returns one
+MySQLdb connection per app context, but it is borrowed from a bounded pool and
+handed back on teardown instead of being opened (connect + auth) and closed
+for every request, scheduler run and CLI command.
+"""
+import queue
+import threading
+import time
+
+import MySQLdb
+from MySQLdb import cursors
+from flask import g
+
+
+class PoolExhausted(Exception):
+    """No connection became free within the pool's checkout timeout."""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of MySQLdb connections.
+
+    At most ``size`` connections exist at once; callers wait up to ``timeout``
+    seconds for one. Connections older than ``recycle`` seconds are closed
+    instead of reused, and one that sat idle longer than ``ping_after`` seconds
+    is pinged before it is handed out, so a server-side wait_timeout never
+    surfaces as a failed query.
+    """
+
+    def __init__(self, connect, size=10, timeout=5.0, recycle=3600, ping_after=30):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        # LIFO keeps a few connections hot; the rest age out through recycle.
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._stats = {
+            "checkouts": 0,
+            "connects": 0,
+            "recycled": 0,
+            "ping_failures": 0,
+            "timeouts": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+        }
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _new(self):
+        conn = self._connect()
+        conn._pool_created_at = time.monotonic()
+        conn._pool_released_at = conn._pool_created_at
+        self._count("connects")
+        return conn
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except MySQLdb.Error:
+            pass
+
+    def _checkout(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return self._new()
+
+            now = time.monotonic()
+            if now - conn._pool_created_at > self.recycle:
+                self._close(conn)
+                self._count("recycled")
+                continue
+
+            if now - conn._pool_released_at > self.ping_after:
+                try:
+                    conn.ping()
+                except MySQLdb.Error:
+                    self._close(conn)
+                    self._count("ping_failures")
+                    continue
+            return conn
+
+    def acquire(self):
+        """Borrows a healthy connection; raises PoolExhausted after ``timeout``."""
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count("timeouts")
+            raise PoolExhausted(f"No MySQL connection free within {self.timeout}s (pool size {self.size})")
+
+        waited_ms = (time.perf_counter() - started) * 1000
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+            self._stats["wait_ms_total"] += waited_ms
+            self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], waited_ms)
+        return conn
+
+    def release(self, conn):
+        """Returns a connection; any open transaction is rolled back first."""
+        try:
+            # Never let a half-finished request's writes leak into the next borrower.
+            conn.rollback()
+            conn._pool_released_at = time.monotonic()
+            self._idle.put(conn)
+        except MySQLdb.Error:
+            self._close(conn)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_use"] = self._in_use
+        stats["size"] = self.size
+        stats["idle"] = self._idle.qsize()
+        stats["wait_ms_avg"] = round(stats["wait_ms_total"] / stats["checkouts"], 2) if stats["checkouts"] else 0.0
+        stats["wait_ms_total"] = round(stats["wait_ms_total"], 1)
+        stats["wait_ms_max"] = round(stats["wait_ms_max"], 1)
+        return stats
+
+
+class PooledMySQL:
+    """flask_mysqldb-compatible extension backed by a ConnectionPool."""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.pool = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Same settings as flask_mysqldb, plus the pool's own.
+        app.config.setdefault("MYSQL_HOST", "localhost")
+        app.config.setdefault("MYSQL_USER", None)
+        app.config.setdefault("MYSQL_PASSWORD", None)
+        app.config.setdefault("MYSQL_DB", None)
+        app.config.setdefault("MYSQL_PORT", 3306)
+        app.config.setdefault("MYSQL_UNIX_SOCKET", None)
+        app.config.setdefault("MYSQL_CONNECT_TIMEOUT", 10)
+        app.config.setdefault("MYSQL_CHARSET", "utf8")
+        app.config.setdefault("MYSQL_CURSORCLASS", None)
+        app.config.setdefault("MYSQL_AUTOCOMMIT", False)
+        app.config.setdefault("MYSQL_CUSTOM_OPTIONS", None)
+        app.config.setdefault("MYSQL_POOL_SIZE", 10)
+        app.config.setdefault("MYSQL_POOL_TIMEOUT", 5.0)
+        app.config.setdefault("MYSQL_POOL_RECYCLE", 3600)
+        app.config.setdefault("MYSQL_POOL_PRE_PING_AFTER", 30)
+
+        config = app.config
+        self.pool = ConnectionPool(
+            lambda: MySQLdb.connect(**self.connect_kwargs(config)),
+            size=config["MYSQL_POOL_SIZE"],
+            timeout=config["MYSQL_POOL_TIMEOUT"],
+            recycle=config["MYSQL_POOL_RECYCLE"],
+            ping_after=config["MYSQL_POOL_PRE_PING_AFTER"]
+        )
+        app.teardown_appcontext(self.teardown)
+
+    @staticmethod
+    def connect_kwargs(config):
+        kwargs = {
+            "host": config["MYSQL_HOST"],
+            "port": config["MYSQL_PORT"],
+            "connect_timeout": config["MYSQL_CONNECT_TIMEOUT"],
+            "charset": config["MYSQL_CHARSET"],
+            "use_unicode": True,
+            "autocommit": config["MYSQL_AUTOCOMMIT"],
+        }
+        if config["MYSQL_USER"]:
+            kwargs["user"] = config["MYSQL_USER"]
+        if config["MYSQL_PASSWORD"]:
+            kwargs["passwd"] = config["MYSQL_PASSWORD"]
+        if config["MYSQL_DB"]:
+            kwargs["db"] = config["MYSQL_DB"]
+        if config["MYSQL_UNIX_SOCKET"]:
+            kwargs["unix_socket"] = config["MYSQL_UNIX_SOCKET"]
+        if config["MYSQL_CURSORCLASS"]:
+            kwargs["cursorclass"] = getattr(cursors, config["MYSQL_CURSORCLASS"])
+        if config["MYSQL_CUSTOM_OPTIONS"]:
+            kwargs.update(config["MYSQL_CUSTOM_OPTIONS"])
+        return kwargs
+
+    @property
+    def connection(self):
+        """The connection borrowed for the current app context."""
+        if "mysql_db" not in g:
+            g.mysql_db = self.pool.acquire()
+        return g.mysql_db
+
+    def release(self):
+        """Returns the current app context's connection to the pool early.
+
+        For long-lived contexts such as streamed responses; the next use of
+        ``connection`` in the same context borrows a fresh one.
+        """
+        conn = g.pop("mysql_db", None)
+        if conn is not None:
+            self.pool.release(conn)
+
+    def teardown(self, exception):
+        self.release()
+
+    def stats(self):
+        return self.pool.stats()
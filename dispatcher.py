@@ -0,0 +1,130 @@
+"""
+Concurrent dispatch engine for scheduled LinkedIn posts.
+
+The engine only deals with running the network side of publishing on a worker
+pool; fetching due posts and recording their outcome stays with the caller.
+"""
+import heapq
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class DispatchEngine:
+    """Publishes a batch of posts on a bounded worker pool.
+
+    At most ``per_token_limit`` posts sharing one access token are in flight at
+    any moment, so a single author with many due posts cannot trip LinkedIn's
+    per-member throttling or starve the other authors in the batch.
+    """
+
+    def __init__(self, max_workers=8, per_token_limit=2):
+        self.max_workers = max(1, int(max_workers))
+        self.per_token_limit = max(1, int(per_token_limit))
+
+    def run(self, jobs, publish):
+        """Run ``publish(job)`` for every job and return the results in job order.
+
+        Each job is a dict carrying at least an ``access_token`` key. ``publish``
+        must return a dict; the engine adds ``duration_ms`` to it. An exception
+        raised by ``publish`` is turned into a failed result instead of aborting
+        the rest of the batch.
+        """
+        results = [None] * len(jobs)
+        if not jobs:
+            return results
+
+        # One FIFO queue per access token keeps each author's posts in order.
+        queues = OrderedDict()
+        for index, job in enumerate(jobs):
+            queues.setdefault(job["access_token"], deque()).append(index)
+
+        in_flight = {}
+        running_per_token = {token: 0 for token in queues}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="dispatch") as pool:
+
+            def submit_ready():
+                # Top up every token to its limit; tokens waiting on their own
+                # cap never occupy a worker thread.
+                for token, queue in queues.items():
+                    while queue and running_per_token[token] < self.per_token_limit:
+                        index = queue.popleft()
+                        running_per_token[token] += 1
+                        future = pool.submit(self._timed, publish, jobs[index])
+                        in_flight[future] = (index, token)
+
+            submit_ready()
+            while in_flight:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, token = in_flight.pop(future)
+                    running_per_token[token] -= 1
+                    results[index] = future.result()
+                submit_ready()
+
+        return results
+
+    @staticmethod
+    def _timed(publish, job):
+        started = time.perf_counter()
+        try:
+            result = publish(job)
+        except Exception as e:
+            print(f"[DISPATCH ERROR] {e}")
+            print(traceback.format_exc())
+            result = {"success": False, "reason": str(e)}
+        result["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+
+class DueHeap:
+    """Min-heap of upcoming publish times that arms a single wakeup job.
+
+    The scheduler sleeps until the earliest known ``post_date`` (or at most
+    ``max_sleep`` seconds, which also retries posts that failed). Writers call
+    ``push`` when they add or move a post, which only touches the heap and
+    re-arms the job if the new time is earlier than the current wakeup.
+    """
+
+    JOB_ID = "dispatch_due_posts"
+
+    def __init__(self, scheduler, wake, max_sleep=300):
+        self.scheduler = scheduler
+        self.wake = wake
+        self.max_sleep = max_sleep
+        self._heap = []
+        self._armed_at = None
+        self._lock = threading.Lock()
+
+    def reload(self, publish_times):
+        """Replaces the heap with freshly loaded upcoming publish times."""
+        with self._lock:
+            self._heap = [when for when in publish_times if when]
+            heapq.heapify(self._heap)
+            self._armed_at = None
+            self._arm()
+
+    def push(self, when):
+        """Records a new or moved publish time and wakes earlier if needed."""
+        if not when:
+            return
+        with self._lock:
+            heapq.heappush(self._heap, when)
+            if self._armed_at is None or when < self._armed_at:
+                self._arm()
+
+    def _arm(self):
+        now = datetime.now()
+        run_at = now + timedelta(seconds=self.max_sleep)
+        if self._heap and self._heap[0] < run_at:
+            run_at = max(self._heap[0], now)
+
+        self._armed_at = run_at
+        self.scheduler.add_job(
+            self.wake, "date", run_date=run_at, id=self.JOB_ID,
+            replace_existing=True, misfire_grace_time=None
+        )
@@ -0,0 +1,115 @@
+"""
+Image processing for post images.
+
+Uploads are normalised once when they are saved so that every later reader
+(the dispatcher, the post list) deals with small, metadata-free files whose
+extension matches their real format.
+"""
+import hashlib
+import io
+
+from PIL import Image, ImageOps
+
+# LinkedIn renders feed images at most ~1200px wide; 1920 keeps zoom crisp.
+MAX_DIMENSION = 1920
+JPEG_QUALITY = 85
+READ_CHUNK_SIZE = 64 * 1024
+
+# Thumbnail widths (longest side, px) served to list views instead of originals.
+THUMBNAIL_SIZES = {
+    "sm": 160,
+    "md": 640,
+}
+THUMBNAIL_QUALITY = 80
+
+MIME_TYPES = {
+    ".jpg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+}
+
+
+def read_and_hash(stream, chunk_size=READ_CHUNK_SIZE):
+    """Reads an upload in chunks, hashing as it goes; returns ``(data, sha256_hex)``."""
+    digest = hashlib.sha256()
+    buf = io.BytesIO()
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+        buf.write(chunk)
+    return buf.getvalue(), digest.hexdigest()
+
+
+def _has_transparency(img):
+    if img.mode in ("RGBA", "LA"):
+        return img.getchannel("A").getextrema()[0] < 255
+    return img.mode == "P" and "transparency" in img.info
+
+
+def optimize_image(stream, max_dimension=MAX_DIMENSION, jpeg_quality=JPEG_QUALITY):
+    """Normalises an uploaded image and returns ``(data, ext, mime)``.
+
+    The image is rotated according to its EXIF orientation and scaled down to
+    ``max_dimension`` on its longest side. Opaque images are re-encoded as
+    progressive JPEG (or optimised PNG when a PNG source compresses better
+    losslessly) and transparent ones as optimised PNG. EXIF and other
+    metadata are dropped; only the colour profile is kept. Animated GIFs are
+    passed through unchanged. Raises if the stream is not a readable image.
+    """
+    raw = stream.read()
+    img = Image.open(io.BytesIO(raw))
+
+    if getattr(img, "is_animated", False):
+        return raw, ".gif", MIME_TYPES[".gif"]
+
+    icc_profile = img.info.get("icc_profile")
+    source_format = img.format
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    candidates = []
+    if _has_transparency(img):
+        candidates.append((_encode(img.convert("RGBA"), "PNG", optimize=True, icc_profile=icc_profile), ".png"))
+    else:
+        rgb = img.convert("RGB")
+        candidates.append((_encode(
+            rgb, "JPEG", quality=jpeg_quality, optimize=True, progressive=True, icc_profile=icc_profile
+        ), ".jpg"))
+        if source_format == "PNG":
+            # Flat graphics and screenshots often compress better losslessly.
+            candidates.append((_encode(rgb, "PNG", optimize=True, icc_profile=icc_profile), ".png"))
+
+    data, ext = min(candidates, key=lambda candidate: len(candidate[0]))
+    return data, ext, MIME_TYPES[ext]
+
+
+def make_thumbnail(path, max_dimension, quality=THUMBNAIL_QUALITY):
+    """Returns JPEG bytes of the image at ``path`` scaled to ``max_dimension``.
+
+    Animated GIFs use their first frame and transparency is flattened onto
+    white, so every thumbnail is a small, single-format file.
+    """
+    with Image.open(path) as img:
+        img.seek(0)
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+        if _has_transparency(img):
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+
+        return _encode(img.convert("RGB"), "JPEG", quality=quality, optimize=True, progressive=True)
+
+
+def _encode(img, fmt, **params):
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **params)
+    return buf.getvalue()
+
+
+def mime_type_for(filename):
+    """MIME type for a stored image, based on the extension optimize_image chose."""
+    ext = "." + filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if ext == ".jpeg":
+        ext = ".jpg"
+    return MIME_TYPES.get(ext, "image/jpeg")
@@ -0,0 +1,347 @@
+"""
+Pooled, keep-alive client for the LinkedIn REST and OAuth endpoints.
+
+Every call goes through one shared requests.Session per host, so repeated
+calls to api.linkedin.com reuse an open TLS connection instead of paying a
+fresh handshake each time. Calls are paced by token buckets (one for the app,
+one per access token) that adapt to LinkedIn's throttling responses, and
+throttled or transient failures are retried with jittered exponential backoff.
+"""
+import hashlib
+import random
+import threading
+import time
+from collections import namedtuple
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API_BASE = "https://api.linkedin.com/v2"
+OAUTH_TOKEN_URL = "https://www.linkedin.com/oauth/v2/accessToken"
+UPLOAD_MECHANISM = "com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest"
+
+# (connect, read) in seconds
+DEFAULT_TIMEOUT = (5, 20)
+UPLOAD_TIMEOUT = (5, 120)
+
+# Request pacing (requests per second) and retry policy
+DEFAULT_APP_RATE = 20.0
+DEFAULT_TOKEN_RATE = 5.0
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_MAX_RETRY_WAIT = 60.0
+BACKOFF_BASE = 0.5
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE"}
+
+UploadRegistration = namedtuple("UploadRegistration", ["upload_url", "asset_urn"])
+
+
+class LinkedInAPIError(Exception):
+    """A LinkedIn endpoint answered with a non-success status code."""
+
+    def __init__(self, status_code, body, message=None):
+        self.status_code = status_code
+        self.body = body
+        self.message = message or body
+        super().__init__(f"LinkedIn API error {status_code}: {self.message}")
+
+    @classmethod
+    def from_response(cls, response):
+        try:
+            message = response.json().get("message")
+        except ValueError:
+            message = None
+        return cls(response.status_code, response.text, message)
+
+
+class LinkedInRateLimited(LinkedInAPIError):
+    """LinkedIn has throttled us for longer than we are willing to wait.
+
+    Raised before a request is sent when its bucket is blocked past the retry
+    budget, so calls that are sure to be rejected never go out.
+    """
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(429, "", f"Rate limited; retry in {retry_after:.1f}s")
+
+
+def _is_throttled(response):
+    """True for responses that make a TokenBucket pause (see TokenBucket.observe)."""
+    return response.status_code == 429 or response.headers.get("X-RateLimit-Remaining") == "0"
+
+
+def _retry_after_seconds(response):
+    """Reads Retry-After (seconds or HTTP date) or X-RateLimit-Reset, if present."""
+    value = response.headers.get("Retry-After")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    reset = response.headers.get("X-RateLimit-Reset")
+    if reset:
+        try:
+            reset = float(reset)
+        except ValueError:
+            return None
+        # Either an epoch timestamp or a number of seconds from now.
+        return max(0.0, reset - time.time()) if reset > 1e9 else reset
+    return None
+
+
+class TokenBucket:
+    """Token bucket whose refill rate adapts to LinkedIn's responses.
+
+    A 429 (or an exhausted X-RateLimit-Remaining) halves the rate and blocks
+    the bucket until Retry-After has passed; every success creeps the rate
+    back up towards its configured ceiling.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.max_rate = float(rate)
+        self.min_rate = self.max_rate / 32
+        self.rate = self.max_rate
+        self.capacity = float(capacity or max(1.0, rate))
+        self.tokens = self.capacity
+        self.blocked_until = 0.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, max_wait):
+        """Takes one token, sleeping as needed; raises LinkedInRateLimited past max_wait."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+
+            if wait > max_wait:
+                raise LinkedInRateLimited(wait)
+            time.sleep(wait)
+
+    def observe(self, response, block=True):
+        """Adapts the rate from a response's status and rate-limit headers.
+
+        With ``block=False`` a throttling response only slows the bucket down
+        instead of also pausing it for the Retry-After window.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if _is_throttled(response):
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.tokens = 0.0
+                if block:
+                    retry_after = _retry_after_seconds(response)
+                    if retry_after is None:
+                        retry_after = 1 / self.rate
+                    self.blocked_until = max(self.blocked_until, now + retry_after)
+            elif response.status_code < 400:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class LinkedInClient:
+    """Thread-safe LinkedIn client with one pooled session per host."""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, upload_timeout=UPLOAD_TIMEOUT, pool_maxsize=20,
+                 app_rate=DEFAULT_APP_RATE, token_rate=DEFAULT_TOKEN_RATE,
+                 max_retries=DEFAULT_MAX_RETRIES, max_retry_wait=DEFAULT_MAX_RETRY_WAIT):
+        self.timeout = timeout
+        self.upload_timeout = upload_timeout
+        self.pool_maxsize = pool_maxsize
+        self.token_rate = token_rate
+        self.max_retries = max_retries
+        self.max_retry_wait = max_retry_wait
+        self._sessions = {}
+        self._app_bucket = TokenBucket(app_rate)
+        self._token_buckets = {}
+        self._lock = threading.Lock()
+
+    # ---------- transport ----------
+
+    def session_for(self, url):
+        """Returns the shared keep-alive session for the URL's host."""
+        host = urlsplit(url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[host] = session
+            return session
+
+    def _buckets_for(self, access_token):
+        if not access_token:
+            return [self._app_bucket]
+        # Keyed by a digest so raw tokens are not kept around as dict keys.
+        key = hashlib.sha256(access_token.encode()).hexdigest()
+        with self._lock:
+            bucket = self._token_buckets.get(key)
+            if bucket is None:
+                bucket = self._token_buckets[key] = TokenBucket(self.token_rate)
+        return [self._app_bucket, bucket]
+
+    def _backoff(self, attempt):
+        # Full jitter: anywhere between 0 and the exponential ceiling.
+        return random.uniform(0, min(self.max_retry_wait, BACKOFF_BASE * (2 ** attempt)))
+
+    def request(self, method, url, access_token=None, restli=False, idempotent=None, **kwargs):
+        """Sends a throttled, retried request on the host's pooled session.
+
+        429 and 5xx responses and connection failures are retried up to
+        max_retries times, honouring Retry-After. Non-idempotent calls (POST by
+        default) are only retried when LinkedIn cannot have acted on them: a
+        429 or a failure to connect. The final response is returned as-is.
+        """
+        headers = kwargs.pop("headers", None) or {}
+        if access_token:
+            headers["Authorization"] = f"Bearer {access_token}"
+        if restli:
+            headers["X-Restli-Protocol-Version"] = "2.0.0"
+        kwargs.setdefault("timeout", self.timeout)
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+
+        session = self.session_for(url)
+        buckets = self._buckets_for(access_token)
+
+        for attempt in range(self.max_retries + 1):
+            for bucket in buckets:
+                bucket.acquire(self.max_retry_wait)
+
+            try:
+                response = session.request(method, url, headers=headers, **kwargs)
+            except requests.ConnectionError as e:
+                retryable = idempotent or isinstance(e, requests.ConnectTimeout)
+                if not retryable or attempt == self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+            except requests.Timeout:
+                if not idempotent or attempt == self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+
+            # A throttled member should not pause every other member's calls, so
+            # the shared app bucket only slows down when a token bucket exists.
+            for bucket in buckets:
+                bucket.observe(response, block=bucket is buckets[-1])
+
+            retryable = response.status_code in RETRY_STATUSES and (idempotent or response.status_code == 429)
+            if not retryable or attempt == self.max_retries:
+                return response
+
+            retry_after = _retry_after_seconds(response)
+            delay = self._backoff(attempt) if retry_after is None else retry_after
+            if delay > self.max_retry_wait:
+                # Sure to fail again within our budget; leave it for a later run.
+                return response
+
+            print(f"[LINKEDIN RETRY] {method} {url} -> {response.status_code}, retrying in {delay:.1f}s")
+            if retry_after is None or not _is_throttled(response):
+                time.sleep(delay)
+            # Otherwise the throttled bucket already holds the next acquire() back
+            # for Retry-After; a 5xx never blocks the bucket, so it sleeps here.
+
+        return response
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+    # ---------- typed helpers ----------
+
+    def exchange_code(self, code, redirect_uri, client_id, client_secret):
+        """Trades an OAuth authorization code for a token payload dict."""
+        response = self.request("POST", OAUTH_TOKEN_URL, idempotent=False, data={
+            "grant_type": "authorization_code",
+            "code": code,
+            "redirect_uri": redirect_uri,
+            "client_id": client_id,
+            "client_secret": client_secret
+        })
+        if response.status_code != 200:
+            raise LinkedInAPIError.from_response(response)
+        return response.json()
+
+    def userinfo(self, access_token):
+        """Returns the OpenID Connect profile (sub, name, email, picture)."""
+        response = self.request("GET", f"{API_BASE}/userinfo", access_token)
+        if response.status_code != 200:
+            raise LinkedInAPIError.from_response(response)
+        return response.json()
+
+    def register_upload(self, access_token, author_urn):
+        """Registers a feed image upload and returns its UploadRegistration."""
+        body = {
+            "registerUploadRequest": {
+                "owner": f"urn:li:person:{author_urn}",
+                "recipes": ["urn:li:digitalmediaRecipe:feedshare-image"],
+                "serviceRelationships": [
+                    {"relationshipType": "OWNER", "identifier": "urn:li:userGeneratedContent"}
+                ]
+            }
+        }
+        # Re-registering only orphans an unused asset, so this POST is safe to retry.
+        response = self.request(
+            "POST", f"{API_BASE}/assets?action=registerUpload", access_token,
+            restli=True, idempotent=True, json=body
+        )
+        if response.status_code not in (200, 201):
+            raise LinkedInAPIError.from_response(response)
+
+        value = response.json()["value"]
+        return UploadRegistration(
+            upload_url=value["uploadMechanism"][UPLOAD_MECHANISM]["uploadUrl"],
+            asset_urn=value["asset"]
+        )
+
+    def upload_asset(self, access_token, upload_url, data, content_type):
+        """PUTs the asset bytes to the URL handed out by register_upload."""
+        if hasattr(data, "read"):
+            # Retries must be able to resend the body.
+            data = data.read()
+        response = self.request(
+            "PUT", upload_url, access_token,
+            headers={"Content-Type": content_type},
+            data=data,
+            timeout=self.upload_timeout
+        )
+        if response.status_code not in (200, 201):
+            raise LinkedInAPIError.from_response(response)
+
+    def create_ugc_post(self, access_token, body):
+        """Publishes a ugcPosts share and returns the new post's URN."""
+        response = self.request("POST", f"{API_BASE}/ugcPosts", access_token, restli=True, json=body)
+        if response.status_code not in (200, 201):
+            raise LinkedInAPIError.from_response(response)
+
+        post_urn = response.headers.get("x-restli-id")
+        if not post_urn:
+            try:
+                post_urn = response.json().get("id")
+            except ValueError:
+                post_urn = None
+        return post_urn
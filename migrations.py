@@ -0,0 +1,238 @@
+"""
+Versioned schema migrations for the MySQL database.
+
+Run ``flask --app app db-upgrade`` after deploying. Every applied version is
+recorded in ``schema_migrations`` so each step runs exactly once per database.
+A step is either an SQL string or a callable taking a cursor, for backfills
+that need Python.
+"""
+
+
+def _backfill_post_images(cur):
+    """Copies the legacy CSV ``image``/``asset_urns`` columns into post_images."""
+    cur.execute("""
+        SELECT id, image, asset_urns FROM scheduled_posts
+        WHERE image IS NOT NULL AND image <> ''
+    """)
+    rows = []
+    for post in cur.fetchall():
+        filenames = [name.strip() for name in post["image"].split(",") if name.strip()][:5]
+        assets = [urn.strip() for urn in (post["asset_urns"] or "").split(",") if urn.strip()]
+        if len(assets) != len(filenames):
+            assets = [None] * len(filenames)
+        rows.extend(
+            (post["id"], position, filename, asset_urn)
+            for position, (filename, asset_urn) in enumerate(zip(filenames, assets))
+        )
+
+    if rows:
+        cur.executemany(
+            "INSERT INTO post_images (post_id, position, filename, asset_urn) VALUES (%s, %s, %s, %s)",
+            rows
+        )
+
+
+# (version, description, steps)
+MIGRATIONS = [
+    (0, "Baseline tables", [
+        """
+        CREATE TABLE IF NOT EXISTS linkedin_tokens (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_urn VARCHAR(100) NULL,
+            access_token TEXT NULL,
+            user_name VARCHAR(255) NULL,
+            user_email VARCHAR(255) NULL,
+            password VARCHAR(255) NULL,
+            added_by VARCHAR(100) NULL,
+            added_date DATETIME NULL,
+            updated_by VARCHAR(100) NULL,
+            updated_date DATETIME NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS scheduled_posts (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            post_date DATE NOT NULL,
+            content TEXT NOT NULL,
+            image TEXT NULL,
+            added_by VARCHAR(255) NULL,
+            author_urn VARCHAR(100) NULL,
+            posted TINYINT(1) NOT NULL DEFAULT 0,
+            posted_at DATETIME NULL,
+            added_date DATETIME NULL,
+            updated_by VARCHAR(255) NULL,
+            updated_date DATETIME NULL
+        )
+        """,
+    ]),
+    (1, "Minute-precision publish times and due-post index", [
+        "ALTER TABLE scheduled_posts MODIFY post_date DATETIME NOT NULL",
+        "CREATE INDEX idx_scheduled_posts_due ON scheduled_posts (posted, post_date)",
+    ]),
+    (2, "Server-side store for generated drafts", [
+        """
+        CREATE TABLE generation_drafts (
+            id CHAR(32) PRIMARY KEY,
+            user_id INT NOT NULL,
+            content MEDIUMTEXT NOT NULL,
+            created_at DATETIME NOT NULL,
+            expires_at DATETIME NOT NULL,
+            INDEX idx_generation_drafts_user (user_id),
+            INDEX idx_generation_drafts_expires (expires_at)
+        )
+        """,
+    ]),
+    (3, "Pre-staged LinkedIn asset URNs on scheduled posts", [
+        """
+        ALTER TABLE scheduled_posts
+            ADD COLUMN asset_urns TEXT NULL,
+            ADD COLUMN assets_staged_at DATETIME NULL
+        """,
+    ]),
+    (4, "Content-addressed image store and reusable LinkedIn assets", [
+        """
+        CREATE TABLE image_blobs (
+            content_hash CHAR(64) PRIMARY KEY,
+            filename VARCHAR(100) NOT NULL,
+            size_bytes INT NOT NULL,
+            refcount INT NOT NULL DEFAULT 0,
+            created_at DATETIME NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE linkedin_assets (
+            owner_urn VARCHAR(100) NOT NULL,
+            content_hash CHAR(64) NOT NULL,
+            asset_urn VARCHAR(255) NOT NULL,
+            created_at DATETIME NOT NULL,
+            PRIMARY KEY (owner_urn, content_hash)
+        )
+        """,
+    ]),
+    (5, "Keyset index for listing an author's posts", [
+        "CREATE INDEX idx_scheduled_posts_author_date ON scheduled_posts (author_urn, post_date, id)",
+    ]),
+    (6, "Per-author post counters for the profile page", [
+        """
+        CREATE TABLE post_counters (
+            author_urn VARCHAR(100) PRIMARY KEY,
+            total_posts INT NOT NULL DEFAULT 0,
+            scheduled_posts INT NOT NULL DEFAULT 0,
+            published_posts INT NOT NULL DEFAULT 0,
+            updated_at DATETIME NOT NULL
+        )
+        """,
+        """
+        INSERT INTO post_counters (author_urn, total_posts, scheduled_posts, published_posts, updated_at)
+        SELECT author_urn,
+               COUNT(*),
+               SUM(CASE WHEN posted = 0 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN posted = 1 THEN 1 ELSE 0 END),
+               NOW()
+        FROM scheduled_posts
+        WHERE author_urn IS NOT NULL
+        GROUP BY author_urn
+        """,
+    ]),
+    (7, "Indexes for status-filtered listings and account lookups", [
+        "CREATE INDEX idx_scheduled_posts_author_status ON scheduled_posts (author_urn, posted, post_date)",
+        "CREATE INDEX idx_linkedin_tokens_user_urn ON linkedin_tokens (user_urn)",
+        "CREATE INDEX idx_linkedin_tokens_user_email ON linkedin_tokens (user_email)",
+    ]),
+    (8, "Normalized post_images table", [
+        """
+        CREATE TABLE post_images (
+            post_id INT NOT NULL,
+            position TINYINT NOT NULL,
+            filename VARCHAR(100) NOT NULL,
+            asset_urn VARCHAR(255) NULL,
+            PRIMARY KEY (post_id, position),
+            INDEX idx_post_images_filename (filename)
+        )
+        """,
+        _backfill_post_images,
+    ]),
+    (9, "Durable publish outbox with attempt history", [
+        """
+        CREATE TABLE publish_jobs (
+            post_id INT PRIMARY KEY,
+            idempotency_key CHAR(64) NOT NULL,
+            author_urn VARCHAR(100) NULL,
+            status VARCHAR(20) NOT NULL,
+            attempts INT NOT NULL DEFAULT 0,
+            next_attempt_at DATETIME NOT NULL,
+            lease_owner VARCHAR(64) NULL,
+            lease_expires_at DATETIME NULL,
+            linkedin_post_urn VARCHAR(255) NULL,
+            last_error TEXT NULL,
+            created_at DATETIME NOT NULL,
+            updated_at DATETIME NOT NULL,
+            UNIQUE KEY uq_publish_jobs_idempotency (idempotency_key),
+            INDEX idx_publish_jobs_claim (status, next_attempt_at),
+            INDEX idx_publish_jobs_lease (lease_owner)
+        )
+        """,
+        """
+        CREATE TABLE publish_attempts (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            post_id INT NOT NULL,
+            attempt INT NOT NULL,
+            worker_id VARCHAR(64) NOT NULL,
+            idempotency_key CHAR(64) NOT NULL,
+            started_at DATETIME NOT NULL,
+            finished_at DATETIME NULL,
+            outcome VARCHAR(20) NOT NULL,
+            status_code INT NULL,
+            error TEXT NULL,
+            linkedin_post_urn VARCHAR(255) NULL,
+            UNIQUE KEY uq_publish_attempts_post_attempt (post_id, attempt)
+        )
+        """,
+    ]),
+    (10, "Pending streamed-generation parameters on drafts", [
+        "ALTER TABLE generation_drafts ADD COLUMN pending_generation MEDIUMTEXT NULL",
+    ]),
+]
+
+
+def applied_versions(connection):
+    """Returns the set of migration versions already applied."""
+    cur = connection.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL
+        )
+    """)
+    cur.execute("SELECT version FROM schema_migrations")
+    versions = {row["version"] for row in cur.fetchall()}
+    cur.close()
+    return versions
+
+
+def upgrade(connection):
+    """Applies every pending migration in version order and returns their versions."""
+    done = applied_versions(connection)
+    applied = []
+
+    for version, description, statements in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in done:
+            continue
+
+        print(f"[MIGRATE] Applying {version}: {description}")
+        cur = connection.cursor()
+        for statement in statements:
+            if callable(statement):
+                statement(cur)
+            else:
+                cur.execute(statement)
+        cur.execute(
+            "INSERT INTO schema_migrations (version, description, applied_at) VALUES (%s, %s, NOW())",
+            (version, description)
+        )
+        connection.commit()
+        cur.close()
+        applied.append(version)
+
+    return applied
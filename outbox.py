@@ -0,0 +1,178 @@
+"""
+Durable publish outbox for scheduled posts.
+
+Every due post gets one ``publish_jobs`` row, keyed by post id and carrying an
+idempotency key. Dispatchers claim jobs by writing a lease with a single
+UPDATE, so any number of processes can drain the outbox in parallel without
+two of them ever holding the same post. Each try is recorded in
+``publish_attempts``.
+
+All functions take a cursor; the caller commits.
+"""
+import os
+import socket
+import uuid
+
+PENDING = "pending"
+CLAIMED = "claimed"
+PUBLISHED = "published"
+FAILED = "failed"
+# The dispatcher lost track of a post after it may have reached LinkedIn.
+IN_DOUBT = "in_doubt"
+
+
+def new_worker_id():
+    """A lease owner id unique to one claiming run of one process."""
+    return f"{socket.gethostname()[:40]}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def enqueue_due(cursor, max_lateness_hours):
+    """Creates a pending job for every unpublished post that is due; returns how many."""
+    cursor.execute("""
+        INSERT INTO publish_jobs
+            (post_id, idempotency_key, author_urn, status, attempts, next_attempt_at, created_at, updated_at)
+        SELECT id, SHA2(CONCAT('scheduled_post:', id), 256), author_urn, %s, 0, NOW(), NOW(), NOW()
+        FROM scheduled_posts
+        WHERE posted = 0
+          AND post_date <= NOW()
+          AND post_date > NOW() - INTERVAL %s HOUR
+        ON DUPLICATE KEY UPDATE post_id = post_id
+    """, (PENDING, max_lateness_hours))
+    return cursor.rowcount
+
+
+def expire_leases(cursor, retry_in_doubt=False):
+    """Releases jobs whose dispatcher died or stalled past its lease.
+
+    Such a post may already be on LinkedIn, so it is parked as IN_DOUBT
+    unless ``retry_in_doubt`` is set. Returns how many jobs were released.
+    """
+    cursor.execute("""
+        UPDATE publish_attempts pa
+        JOIN publish_jobs pj ON pj.post_id = pa.post_id AND pj.attempts = pa.attempt
+        SET pa.outcome = 'lease_expired', pa.finished_at = NOW()
+        WHERE pj.status = %s AND pj.lease_expires_at < NOW() AND pa.outcome = 'started'
+    """, (CLAIMED,))
+    cursor.execute("""
+        UPDATE publish_jobs
+        SET status = %s,
+            lease_owner = NULL,
+            lease_expires_at = NULL,
+            next_attempt_at = NOW(),
+            last_error = 'Lease expired before the outcome was recorded',
+            updated_at = NOW()
+        WHERE status = %s AND lease_expires_at < NOW()
+    """, (PENDING if retry_in_doubt else IN_DOUBT, CLAIMED))
+    return cursor.rowcount
+
+
+def shard_clause(shard, column="author_urn"):
+    """SQL condition and params limiting rows to ``shard = (index, count)``, or none."""
+    if not shard or shard[1] <= 1:
+        return "", ()
+    index, count = shard
+    return f" AND MOD(CRC32({column}), %s) = %s", (count, index)
+
+
+def claim(cursor, worker_id, limit, lease_seconds, shard=None):
+    """Leases up to ``limit`` runnable jobs to ``worker_id`` and returns them with their posts.
+
+    The UPDATE takes row locks, so a concurrent claimer waits and then skips
+    rows that no longer match instead of claiming them twice. Jobs whose post
+    has since been published or moved into the future are left alone. With
+    ``shard`` only jobs whose author hashes into that shard are considered. A
+    start row is written to publish_attempts for every claimed job.
+    """
+    shard_sql, shard_params = shard_clause(shard)
+    cursor.execute(f"""
+        UPDATE publish_jobs
+        SET status = %s,
+            lease_owner = %s,
+            lease_expires_at = NOW() + INTERVAL %s SECOND,
+            attempts = attempts + 1,
+            updated_at = NOW()
+        WHERE status = %s AND next_attempt_at <= NOW(){shard_sql}
+          AND EXISTS (
+              SELECT 1 FROM scheduled_posts sp
+              WHERE sp.id = publish_jobs.post_id AND sp.posted = 0 AND sp.post_date <= NOW()
+          )
+        ORDER BY next_attempt_at, post_id
+        LIMIT %s
+    """, (CLAIMED, worker_id, lease_seconds, PENDING, *shard_params, limit))
+    if not cursor.rowcount:
+        return []
+
+    cursor.execute("""
+        SELECT pj.attempts, pj.idempotency_key,
+               sp.id, sp.author_urn, sp.content, sp.post_date, sp.assets_staged_at
+        FROM publish_jobs pj
+        JOIN scheduled_posts sp ON sp.id = pj.post_id
+        WHERE pj.lease_owner = %s AND pj.status = %s
+        ORDER BY sp.post_date, sp.id
+    """, (worker_id, CLAIMED))
+    jobs = list(cursor.fetchall())
+
+    cursor.executemany("""
+        INSERT INTO publish_attempts (post_id, attempt, worker_id, idempotency_key, started_at, outcome)
+        VALUES (%s, %s, %s, %s, NOW(), 'started')
+    """, [(job["id"], job["attempts"], worker_id, job["idempotency_key"]) for job in jobs])
+    return jobs
+
+
+def job_states(cursor, post_ids):
+    """Returns {post_id: job row} (status, attempts, last_error) for the given posts."""
+    if not post_ids:
+        return {}
+    cursor.execute(f"""
+        SELECT post_id, status, attempts, last_error FROM publish_jobs
+        WHERE post_id IN ({", ".join(["%s"] * len(post_ids))})
+    """, tuple(post_ids))
+    return {row["post_id"]: row for row in cursor.fetchall()}
+
+
+def reset_job(cursor, post_id):
+    """Makes an edited post's unclaimed job runnable again from its new post_date.
+
+    A job that is parked as FAILED or IN_DOUBT, or waiting out a retry delay,
+    goes back to PENDING; claimed and published jobs are left untouched. The
+    attempt count is kept so the history in publish_attempts stays unique.
+    """
+    cursor.execute("""
+        UPDATE publish_jobs
+        SET status = %s,
+            next_attempt_at = NOW(),
+            last_error = NULL,
+            updated_at = NOW()
+        WHERE post_id = %s AND status IN (%s, %s, %s)
+    """, (PENDING, post_id, PENDING, FAILED, IN_DOUBT))
+    return cursor.rowcount
+
+
+def record_outcome(cursor, job, worker_id, status, outcome, error=None, status_code=None,
+                   post_urn=None, retry_in=0):
+    """Closes a claimed job's attempt and moves the job to ``status``.
+
+    ``retry_in`` (seconds) delays the next claim of a job put back to PENDING.
+    Returns False when the lease had already expired and been taken over, in
+    which case nothing is changed.
+    """
+    cursor.execute("""
+        UPDATE publish_jobs
+        SET status = %s,
+            lease_owner = NULL,
+            lease_expires_at = NULL,
+            last_error = %s,
+            linkedin_post_urn = COALESCE(%s, linkedin_post_urn),
+            next_attempt_at = NOW() + INTERVAL %s SECOND,
+            updated_at = NOW()
+        WHERE post_id = %s AND lease_owner = %s AND status = %s
+    """, (status, error, post_urn, retry_in, job["id"], worker_id, CLAIMED))
+    if not cursor.rowcount:
+        return False
+
+    cursor.execute("""
+        UPDATE publish_attempts
+        SET outcome = %s, status_code = %s, error = %s, linkedin_post_urn = %s, finished_at = NOW()
+        WHERE post_id = %s AND attempt = %s
+    """, (outcome, status_code, error, post_urn, job["id"], job["attempts"]))
+    return True
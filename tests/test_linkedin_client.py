@@ -0,0 +1,109 @@
+import pytest
+
+import linkedin_client
+from linkedin_client import LinkedInClient
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = ""
+
+
+class FakeSession:
+    """Returns the queued responses in order and counts the calls."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+class FakeClock:
+    """Stands in for the time module; sleep() advances the clock instead of blocking."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        # Real sleeps always let some time pass; without a floor, float rounding
+        # can leave a bucket waiting on an increment too small to move the clock.
+        self.now += max(seconds, 1e-6)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(linkedin_client, "time", fake)
+    return fake
+
+
+def make_client(responses):
+    client = LinkedInClient(app_rate=1000, token_rate=1000)
+    session = FakeSession(responses)
+    client.session_for = lambda url: session
+    return client, session
+
+
+def test_5xx_with_retry_after_waits_before_retrying(clock):
+    client, session = make_client([FakeResponse(503, {"Retry-After": "2"}), FakeResponse(200)])
+
+    response = client.request("GET", "https://api.linkedin.com/v2/me", access_token="token")
+
+    assert response.status_code == 200
+    assert session.calls == 2
+    assert clock.sleeps == [2.0]
+
+
+def test_429_with_retry_after_blocks_the_token_bucket(clock):
+    client, session = make_client([FakeResponse(429, {"Retry-After": "2"}), FakeResponse(200)])
+
+    started = clock.now
+    response = client.request("GET", "https://api.linkedin.com/v2/me", access_token="token")
+
+    assert response.status_code == 200
+    assert session.calls == 2
+    # The wait comes from the bucket's acquire(), not a second sleep on top of it.
+    assert clock.now - started == pytest.approx(2.0)
+
+
+def test_5xx_without_retry_after_backs_off(clock):
+    client, session = make_client([FakeResponse(502), FakeResponse(200)])
+
+    client.request("GET", "https://api.linkedin.com/v2/me", access_token="token")
+
+    assert session.calls == 2
+    assert len(clock.sleeps) == 1
+    assert 0 <= clock.sleeps[0] <= linkedin_client.BACKOFF_BASE
+
+
+def test_non_idempotent_post_is_not_retried_on_5xx(clock):
+    client, session = make_client([FakeResponse(503, {"Retry-After": "1"})])
+
+    response = client.request("POST", "https://api.linkedin.com/v2/ugcPosts", access_token="token")
+
+    assert response.status_code == 503
+    assert session.calls == 1
+    assert clock.sleeps == []
+
+
+def test_retry_after_beyond_budget_returns_the_response(clock):
+    client, session = make_client([FakeResponse(503, {"Retry-After": "600"})])
+
+    response = client.request("GET", "https://api.linkedin.com/v2/me", access_token="token")
+
+    assert response.status_code == 503
+    assert session.calls == 1
+    assert clock.sleeps == []